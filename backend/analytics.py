@@ -0,0 +1,305 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from repository import repository
+from utils import scan_price_ticks
+
+# Bucket sizes of the pre-aggregated rollups, largest first
+ROLLUP_SECONDS = (86400, 3600)
+# Series sources: settled trades and oracle price ticks
+SERIES_SOURCES = ("trades", "oracle")
+# Settlements read from the repository per step of a sync
+SYNC_CHUNK = 5000
+
+
+def _seconds(value) -> Optional[float]:
+    """Local wall-clock time as seconds, so buckets align to local hours and days
+
+    Stored timestamps are naive local times; aware ones are converted first.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _time(seconds: float) -> str:
+    """Inverse of _seconds, as a naive local ISO timestamp"""
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _runs(times: array, start: int, stop: int, interval: Optional[float]) -> Iterator[Tuple[float, int, int]]:
+    """(bucket, i, j): runs of a time-ordered column that fall in one interval bucket"""
+    i = start
+    while i < stop:
+        if interval is None:
+            yield 0.0, i, stop
+            return
+        bucket = times[i] // interval
+        j = bisect_left(times, (bucket + 1) * interval, i, stop)
+        yield bucket, i, j
+        i = j
+
+
+class Rollup:
+    """OHLC, volume, notional and count per fixed-size bucket, as parallel columns"""
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.starts = array('d')
+        self.open = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.close = array('d')
+        self.volume = array('d')
+        self.notional = array('d')
+        self.count = array('q')
+
+    def add(self, time: float, price: float, quantity: float, amount: float):
+        """Fold in an observation later than every one seen so far"""
+        start = time // self.seconds * self.seconds
+        if self.starts and self.starts[-1] == start:
+            self.high[-1] = max(self.high[-1], price)
+            self.low[-1] = min(self.low[-1], price)
+            self.close[-1] = price
+            self.volume[-1] += quantity
+            self.notional[-1] += amount
+            self.count[-1] += 1
+            return
+        for column, value in ((self.starts, start), (self.open, price), (self.high, price),
+                              (self.low, price), (self.close, price), (self.volume, quantity),
+                              (self.notional, amount), (self.count, 1)):
+            column.append(value)
+
+    def rebuild(self, series: "Series", time: float):
+        """Recompute the bucket holding `time` from the raw columns"""
+        start = time // self.seconds * self.seconds
+        i = bisect_left(series.times, start)
+        j = bisect_left(series.times, start + self.seconds)
+        k = bisect_left(self.starts, start)
+        values = (start, series.prices[i], max(series.prices[i:j]), min(series.prices[i:j]),
+                  series.prices[j - 1], sum(series.quantities[i:j]), sum(series.amounts[i:j]), j - i)
+        columns = (self.starts, self.open, self.high, self.low, self.close, self.volume, self.notional, self.count)
+        exists = k < len(self.starts) and self.starts[k] == start
+        for column, value in zip(columns, values):
+            if exists:
+                column[k] = value
+            else:
+                column.insert(k, value)
+
+
+class Series:
+    """Time-ordered observations of one source, crop type and mandi
+
+    Raw observations sit in parallel columns (time, price, quantity,
+    amount) with hourly and daily rollups kept alongside. Oracle ticks are
+    recorded with zero quantity and amount.
+    """
+
+    def __init__(self):
+        self.times = array('d')
+        self.prices = array('d')
+        self.quantities = array('d')
+        self.amounts = array('d')
+        self.rollups = {seconds: Rollup(seconds) for seconds in ROLLUP_SECONDS}
+
+    def add(self, time: float, price: float, quantity: float, amount: float):
+        if not self.times or time >= self.times[-1]:
+            self.times.append(time)
+            self.prices.append(price)
+            self.quantities.append(quantity)
+            self.amounts.append(amount)
+            for rollup in self.rollups.values():
+                rollup.add(time, price, quantity, amount)
+            return
+        # Late arrival: insert in time order and recompute the buckets it lands in
+        i = bisect_right(self.times, time)
+        self.times.insert(i, time)
+        self.prices.insert(i, price)
+        self.quantities.insert(i, quantity)
+        self.amounts.insert(i, amount)
+        for rollup in self.rollups.values():
+            rollup.rebuild(self, time)
+
+    def buckets(self, low: float, high: float, interval: Optional[float]) -> List[list]:
+        """Aggregates per interval bucket of the observations in [low, high]
+
+        With no interval the whole range is one bucket. Whole rollup
+        buckets inside the range are read from the largest rollup that
+        divides the interval; only the partial buckets at either edge read
+        raw observations. Each bucket is aggregated with min/max/sum over
+        column slices.
+        """
+        rollup = next((self.rollups[s] for s in ROLLUP_SECONDS if interval is None or interval % s == 0), None)
+        first, last = bisect_left(self.times, low), bisect_right(self.times, high)
+        parts = []
+        if rollup is not None:
+            size = rollup.seconds
+            # Rollup buckets lying wholly within [low, high]
+            i = bisect_left(rollup.starts, -(-low // size) * size) if low > float('-inf') else 0
+            j = bisect_right(rollup.starts, high - size) if high < float('inf') else len(rollup.starts)
+            if i < j:
+                middle = bisect_left(self.times, rollup.starts[i])
+                after = bisect_left(self.times, rollup.starts[j - 1] + size)
+                parts.extend(self._raw(first, middle, interval))
+                parts.extend(self._rolled(rollup, i, j, interval))
+                parts.extend(self._raw(after, last, interval))
+                return self._merge(parts)
+        return self._merge(self._raw(first, last, interval))
+
+    def _raw(self, start: int, stop: int, interval: Optional[float]) -> Iterator[list]:
+        prices = self.prices
+        for bucket, i, j in _runs(self.times, start, stop, interval):
+            yield [bucket, prices[i], max(prices[i:j]), min(prices[i:j]), prices[j - 1],
+                   sum(self.quantities[i:j]), sum(self.amounts[i:j]), j - i]
+
+    @staticmethod
+    def _rolled(rollup: Rollup, start: int, stop: int, interval: Optional[float]) -> Iterator[list]:
+        for bucket, i, j in _runs(rollup.starts, start, stop, interval):
+            yield [bucket, rollup.open[i], max(rollup.high[i:j]), min(rollup.low[i:j]), rollup.close[j - 1],
+                   sum(rollup.volume[i:j]), sum(rollup.notional[i:j]), sum(rollup.count[i:j])]
+
+    @staticmethod
+    def _merge(parts) -> List[list]:
+        """Combine time-ordered partial buckets that share a bucket"""
+        merged: List[list] = []
+        for part in parts:
+            if merged and merged[-1][0] == part[0]:
+                current = merged[-1]
+                current[2] = max(current[2], part[2])
+                current[3] = min(current[3], part[3])
+                current[4] = part[4]
+                current[5] += part[5]
+                current[6] += part[6]
+                current[7] += part[7]
+            else:
+                merged.append(part)
+        return merged
+
+
+class MarketAnalytics:
+    """Price history per (crop_type, mandi_id), from settlements and oracle ticks
+
+    Follows the settlements, which the repository keeps in append order,
+    resolving each to its crop, and the price tick history for oracle
+    updates. Like the audit indexes it is built on first use and afterwards
+    only reads what was appended since the last sync, so every worker sees
+    every trade and tick.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._series: Dict[Tuple[str, str, str], Series] = {}
+        self._settled = 0  # settlements read so far
+        self._tick_position = None
+
+    def sync(self):
+        """Add settlements and price ticks recorded since the last sync"""
+        with self._lock:
+            while True:
+                settlements, _ = repository.page("settlements", self._settled, SYNC_CHUNK)
+                if not settlements:
+                    break
+                self._settled += len(settlements)
+                self._add_settlements(settlements)
+            for position, tick in scan_price_ticks(self._tick_position):
+                self._tick_position = position
+                time = _seconds(tick.get('timestamp'))
+                if time is not None:
+                    self._series_for("oracle", tick['crop_type'], tick['mandi_id']).add(
+                        time, float(tick['price_per_kg']), 0.0, 0.0
+                    )
+
+    def _add_settlements(self, settlements: List[Dict]):
+        tokens = repository.get_many("tokens", [s['token_id'] for s in settlements])
+        crops = repository.get_many("crops", [t['linked_crop_id'] if t else None for t in tokens])
+        for settlement, crop in zip(settlements, crops):
+            if crop is None or settlement['settlement_status'] != "COMPLETED":
+                continue
+            time = _seconds(settlement['settlement_time'])
+            if time is None:
+                continue
+            self._series_for("trades", crop['crop_type'], crop['mandi_id']).add(
+                time, settlement['price_per_kg'], settlement['quantity'], settlement['total_amount']
+            )
+
+    def _series_for(self, source: str, crop_type: str, mandi_id: str) -> Series:
+        key = (source, crop_type, mandi_id)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = Series()
+        return series
+
+    def ohlc(self, crop_type: str, mandi_id: str, interval: Optional[int] = None,
+             since: Optional[datetime] = None, until: Optional[datetime] = None,
+             source: str = "trades") -> List[Dict]:
+        """OHLC, traded volume and VWAP per `interval` seconds between two times (inclusive)
+
+        Buckets start at multiples of the interval in local time, so 3600
+        and 86400 give hourly and daily candles. Empty buckets are left out;
+        with no interval the whole range is one bucket.
+        """
+        if source not in SERIES_SOURCES:
+            raise ValueError(f"Unknown series source: {source}")
+        if interval is not None and interval <= 0:
+            raise ValueError("Interval must be positive")
+        low = _seconds(since) if since else float('-inf')
+        high = _seconds(until) if until else float('inf')
+        with self._lock:
+            self.sync()
+            series = self._series.get((source, crop_type, mandi_id))
+            rows = series.buckets(low, high, interval) if series is not None else []
+        return [
+            {
+                "start": _time(bucket * interval) if interval is not None else None,
+                "open": open_, "high": high_, "low": low_, "close": close,
+                "volume": volume,
+                "vwap": notional / volume if volume else None,
+                "count": count
+            }
+            for bucket, open_, high_, low_, close, volume, notional, count in rows
+        ]
+
+    def summary(self, crop_type: str, mandi_id: str, since: Optional[datetime] = None,
+                until: Optional[datetime] = None, source: str = "trades") -> Optional[Dict]:
+        """OHLC, volume and VWAP over a whole time range, or None if nothing was recorded"""
+        rows = self.ohlc(crop_type, mandi_id, None, since, until, source)
+        if not rows:
+            return None
+        summary = rows[0]
+        del summary["start"]
+        return summary
+
+    def markets(self) -> List[Dict]:
+        """Every (crop_type, mandi_id) with recorded trades or ticks, and its overall range"""
+        with self._lock:
+            self.sync()
+            markets: Dict[Tuple[str, str], Dict] = {}
+            for (source, crop_type, mandi_id), series in sorted(self._series.items()):
+                if not series.times:
+                    continue
+                market = markets.setdefault((crop_type, mandi_id), {
+                    "crop_type": crop_type, "mandi_id": mandi_id, "trades": 0, "volume": 0.0,
+                    "oracle_ticks": 0, "first": None, "last": None
+                })
+                if source == "trades":
+                    market["trades"] = len(series.times)
+                    market["volume"] = sum(series.quantities)
+                else:
+                    market["oracle_ticks"] = len(series.times)
+                first, last = _time(series.times[0]), _time(series.times[-1])
+                market["first"] = min(market["first"] or first, first)
+                market["last"] = max(market["last"] or last, last)
+            return list(markets.values())
+
+
+# Shared instance used by the service layer
+market_analytics = MarketAnalytics()
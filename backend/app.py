@@ -1,14 +1,30 @@
-from fastapi import FastAPI, HTTPException
+import time
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from models import (
-    CropRegistrationRequest, TokenListingRequest, TradeAcceptanceRequest
+    CropRegistrationRequest, CropBatchRegistrationRequest, TokenListingRequest,
+    TradeAcceptanceRequest, TradeBatchRequest, PriceTickBatchRequest,
+    BidRequest, BidCancelRequest
 )
-from services import CropTokenizationService
-from utils import (
-    ensure_data_dir, load_crops, load_tokens, load_settlements,
-    find_token_by_id, find_crop_by_id
+from services import (
+    CropTokenizationService, MAX_BATCH_SIZE, MAX_TRADE_BATCH_SIZE, QUERY_SORT_FIELDS,
+    close_verify_pool
 )
-from typing import List
+from repository import repository
+from utils import ensure_data_dir, price_oracle, save_prices
+from merkle import audit_tree
+from stats import stats
+from executor import run_read, run_write
+from metrics import metrics, track_request, finish_request, CONTENT_TYPE
+from http_cache import ResponseCache
+from event_stream import event_broker
+from config import SLOW_REQUEST_MS, RESPONSE_CACHE_MB
+from pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, ndjson_response
+)
+from typing import List, Optional
+from datetime import datetime
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -24,12 +40,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Serialized bodies of the collection and stats endpoints dashboards poll
+response_cache = ResponseCache(int(RESPONSE_CACHE_MB * 1024 * 1024))
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Time every request by route and log slow ones with a storage breakdown"""
+    token = track_request()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        breakdown = finish_request(token)
+        route = request.scope.get("route")
+        # Unmatched paths share one label so scanners cannot grow the series
+        path = route.path if route is not None else "unmatched"
+        metrics.record_request(request.method, path, status, elapsed)
+        if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+            parts = ", ".join(
+                f"{name} {calls}x {seconds * 1000:.1f} ms"
+                for name, (calls, seconds) in sorted(breakdown.items(), key=lambda item: -item[1][1])
+            )
+            print(f"Slow request: {request.method} {path} {status} {elapsed * 1000:.1f} ms ({parts or 'no storage calls'})")
+
 # Initialize data directory on startup
 @app.on_event("startup")
 async def startup_event():
-    ensure_data_dir()
+    await run_write(ensure_data_dir)
+    await run_write(repository.load)
+    await run_write(stats.load)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await event_broker.stop()
+    close_verify_pool()
+
+def _collection_response(name: str, limit: Optional[int], cursor: Optional[str], format: str,
+                         if_none_match: Optional[str] = None):
+    """Full list, one cursor page, or an NDJSON stream of a repository collection
+
+    JSON bodies are cached per collection version and carry an ETag, so an
+    unchanged collection is answered with 304 or the stored bytes.
+    """
+    if format == "ndjson":
+        return ndjson_response(repository.iter_records(name))
+    return response_cache.respond(
+        if_none_match, (name, limit, cursor), repository.version(name),
+        lambda: _collection_body(name, limit, cursor)
+    )
+
+def _collection_body(name: str, limit: Optional[int], cursor: Optional[str]) -> dict:
+    if limit is None and cursor is None:
+        records = list(repository.iter_records(name))
+        return {"success": True, name: records, "total": len(records)}
+    start = decode_cursor(cursor) if cursor else 0
+    if not isinstance(start, int) or start < 0:
+        raise ValueError("Invalid cursor")
+    records, next_start = repository.page(name, start, limit or DEFAULT_PAGE_SIZE)
+    return {
+        "success": True,
+        name: records,
+        "total": repository.count(name),
+        "next_cursor": encode_cursor(next_start) if next_start is not None else None
+    }
 
 # Health check
 @app.get("/")
@@ -40,23 +120,45 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Request and storage metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 # === CROP ENDPOINTS ===
 
 @app.post("/api/crops/register")
 async def register_crop(request: CropRegistrationRequest):
     """Register a new crop and create its digital token"""
     try:
-        result = CropTokenizationService.register_crop(request)
+        result = await run_write(CropTokenizationService.register_crop, request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/crops/register/batch")
+async def register_crops_batch(request: CropBatchRegistrationRequest):
+    """Register many crops at once with per-item results"""
+    if len(request.crops) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_SIZE} crops)")
+    try:
+        return await run_write(CropTokenizationService.register_crops_batch, request.crops)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/crops")
-async def get_all_crops():
-    """Get all registered crops"""
+async def get_all_crops(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Get registered crops (all, one page, or streamed as NDJSON)"""
     try:
-        crops = load_crops()
-        return {"success": True, "crops": crops, "total": len(crops)}
+        return await run_read(_collection_response, "crops", limit, cursor, format,
+                              request.headers.get("if-none-match"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -64,7 +166,7 @@ async def get_all_crops():
 async def get_crop(crop_id: str):
     """Get specific crop by ID"""
     try:
-        crop = find_crop_by_id(crop_id)
+        crop = await run_read(repository.get_crop, crop_id)
         if not crop:
             raise HTTPException(status_code=404, detail="Crop not found")
         return {"success": True, "crop": crop}
@@ -79,7 +181,7 @@ async def get_crop(crop_id: str):
 async def list_token(request: TokenListingRequest):
     """List a token for sale"""
     try:
-        result = CropTokenizationService.list_token(request)
+        result = await run_write(CropTokenizationService.list_token, request)
         if not result['success']:
             raise HTTPException(status_code=400, detail=result['message'])
         return result
@@ -89,11 +191,59 @@ async def list_token(request: TokenListingRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/tokens")
-async def get_all_tokens():
-    """Get all tokens"""
+async def get_all_tokens(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Get tokens (all, one page, or streamed as NDJSON)"""
     try:
-        tokens = load_tokens()
-        return {"success": True, "tokens": tokens, "total": len(tokens)}
+        return await run_read(_collection_response, "tokens", limit, cursor, format,
+                              request.headers.get("if-none-match"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/tokens/query")
+async def query_tokens(
+    status: Optional[str] = None,
+    owner_id: Optional[str] = None,
+    crop_type: Optional[str] = None,
+    mandi_id: Optional[str] = None,
+    quality_grade: Optional[str] = None,
+    min_quantity: Optional[float] = Query(None, ge=0),
+    max_quantity: Optional[float] = Query(None, ge=0),
+    sort_by: str = Query("created_at", pattern=f"^({'|'.join(QUERY_SORT_FIELDS)})$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Search the marketplace with combined filters, returning token + crop rows"""
+    try:
+        offset = decode_cursor(cursor) if cursor else 0
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid cursor")
+        filters = {
+            "status": status.upper() if status else None,
+            "owner_id": owner_id,
+            "crop_type": crop_type,
+            "mandi_id": mandi_id,
+            "quality_grade": quality_grade
+        }
+        rows, total, next_offset = await run_read(
+            CropTokenizationService.query_tokens,
+            filters, min_quantity, max_quantity, sort_by, order == "desc", offset, limit
+        )
+        return {
+            "success": True,
+            "results": rows,
+            "total": total,
+            "next_cursor": encode_cursor(next_offset) if next_offset is not None else None
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -101,12 +251,12 @@ async def get_all_tokens():
 async def get_token(token_id: str):
     """Get specific token by ID"""
     try:
-        token = find_token_by_id(token_id)
+        token = await run_read(repository.get_token, token_id)
         if not token:
             raise HTTPException(status_code=404, detail="Token not found")
         
         # Get linked crop details
-        crop = find_crop_by_id(token['linked_crop_id'])
+        crop = await run_read(repository.get_crop, token['linked_crop_id'])
         
         return {
             "success": True,
@@ -118,12 +268,24 @@ async def get_token(token_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/tokens/{token_id}/history")
+async def get_token_history(token_id: str, proofs: bool = False):
+    """Get the provenance of a token: every audit event about it and its crop"""
+    try:
+        result = await run_read(CropTokenizationService.get_token_history, token_id, proofs)
+        if not result['success']:
+            raise HTTPException(status_code=404, detail=result['message'])
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/tokens/status/{status}")
 async def get_tokens_by_status(status: str):
     """Get tokens filtered by status"""
     try:
-        tokens = load_tokens()
-        filtered = [t for t in tokens if t['status'] == status.upper()]
+        filtered = await run_read(repository.find_tokens, status=status.upper())
         return {"success": True, "tokens": filtered, "total": len(filtered)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -134,7 +296,7 @@ async def get_tokens_by_status(status: str):
 async def execute_settlement(request: TradeAcceptanceRequest):
     """Execute a trade and settlement"""
     try:
-        result = CropTokenizationService.execute_trade(request)
+        result = await run_write(CropTokenizationService.execute_trade, request)
         if not result['success']:
             raise HTTPException(status_code=400, detail=result['message'])
         return result
@@ -143,67 +305,340 @@ async def execute_settlement(request: TradeAcceptanceRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/settlements/execute/batch")
+async def execute_settlements_batch(request: TradeBatchRequest):
+    """Settle many trades at once with per-item results"""
+    if len(request.trades) > MAX_TRADE_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_TRADE_BATCH_SIZE} trades)")
+    try:
+        return await run_write(CropTokenizationService.execute_trades_batch, request.trades)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/settlements")
-async def get_all_settlements():
-    """Get all settlement records"""
+async def get_all_settlements(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$")
+):
+    """Get settlement records (all, one page, or streamed as NDJSON)"""
+    try:
+        return await run_read(_collection_response, "settlements", limit, cursor, format,
+                              request.headers.get("if-none-match"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# === ORDER BOOK ===
+
+@app.post("/api/bids")
+async def place_bid(request: BidRequest):
+    """Place a standing bid, matched against listed tokens in price-time priority"""
+    try:
+        return await run_write(CropTokenizationService.place_bid, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/bids/cancel")
+async def cancel_bid(request: BidCancelRequest):
+    """Withdraw the unfilled part of a bid"""
+    try:
+        result = await run_write(CropTokenizationService.cancel_bid, request)
+        if not result['success']:
+            raise HTTPException(status_code=400, detail=result['message'])
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/bids")
+async def get_bids(
+    buyer_id: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(OPEN|FILLED|CANCELLED)$")
+):
+    """Get bids, optionally for one buyer or status"""
+    try:
+        bids = await run_read(CropTokenizationService.get_bids, buyer_id, status)
+        return {"success": True, "bids": bids, "total": len(bids)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/orderbook/{crop_type}/{mandi_id}/{quality_grade}")
+async def get_order_book(crop_type: str, mandi_id: str, quality_grade: str):
+    """Open bid lots by price and resting tokens by reserve for one book"""
     try:
-        settlements = load_settlements()
-        return {"success": True, "settlements": settlements, "total": len(settlements)}
+        return await run_read(CropTokenizationService.get_order_book, crop_type, mandi_id, quality_grade)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# === PRICE ORACLE ===
+
+@app.get("/api/prices")
+async def get_prices():
+    """Get current oracle prices with staleness flags"""
+    try:
+        prices = await run_read(price_oracle.all)
+        return {"success": True, "prices": prices, "total": len(prices)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/prices/{crop_type}/{mandi_id}")
+async def get_crop_price(crop_type: str, mandi_id: str):
+    """Get the oracle price for a crop at a mandi"""
+    try:
+        entry = await run_read(price_oracle.get, crop_type, mandi_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="No oracle price for this crop and mandi")
+        return {"success": True, "price": price_oracle.quote(entry)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/prices/ticks")
+async def push_price_ticks(request: PriceTickBatchRequest):
+    """Push a batch of fresh price ticks from the mandi feed"""
+    try:
+        ticks = [
+            {**tick.model_dump(), "timestamp": tick.timestamp.isoformat()}
+            for tick in request.ticks
+        ]
+        result = await run_write(save_prices, ticks)
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# === ANALYTICS ===
+
+@app.get("/api/analytics/markets")
+async def get_markets():
+    """Crops and mandis with price history, with their trade counts and time span"""
+    try:
+        markets = await run_read(CropTokenizationService.get_markets)
+        return {"success": True, "markets": markets, "total": len(markets)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analytics/{crop_type}/{mandi_id}/ohlc")
+async def get_price_history(
+    crop_type: str,
+    mandi_id: str,
+    interval: int = Query(86400, ge=60),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    source: str = Query("trades", pattern="^(trades|oracle)$")
+):
+    """OHLC candles with traded volume and VWAP per `interval` seconds (3600 hourly, 86400 daily)"""
+    try:
+        return await run_read(
+            CropTokenizationService.get_price_history, crop_type, mandi_id, interval, since, until, source
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analytics/{crop_type}/{mandi_id}/summary")
+async def get_market_summary(
+    crop_type: str,
+    mandi_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    source: str = Query("trades", pattern="^(trades|oracle)$")
+):
+    """OHLC, traded volume and VWAP over a whole time range"""
+    try:
+        return await run_read(
+            CropTokenizationService.get_market_summary, crop_type, mandi_id, since, until, source
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # === AUDIT ENDPOINTS ===
 
 @app.get("/api/audit/trail")
-async def get_audit_trail():
-    """Get complete audit trail"""
+async def get_audit_trail(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Get the audit trail (all, one page, a time range, or streamed as NDJSON)"""
+    try:
+        if since or until:
+            entries = CropTokenizationService.iter_audit_range(since, until)
+            if format == "ndjson":
+                return ndjson_response(entries)
+            trail = await run_read(list, entries)
+            return {"success": True, "audit_trail": trail, "total_events": len(trail)}
+        if format == "ndjson":
+            return ndjson_response(CropTokenizationService.iter_audit_trail())
+        if limit is None and cursor is None:
+            trail = await run_read(CropTokenizationService.get_audit_trail)
+            return {
+                "success": True,
+                "audit_trail": trail,
+                "total_events": len(trail)
+            }
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and (not isinstance(after, int) or after < 0):
+            raise ValueError("Invalid cursor")
+        page, next_position = await run_read(
+            CropTokenizationService.get_audit_page, after, limit or DEFAULT_PAGE_SIZE
+        )
+        tree_head = await run_read(audit_tree.root)
+        return {
+            "success": True,
+            "audit_trail": page,
+            "total_events": tree_head['tree_size'],
+            "next_cursor": encode_cursor(next_position) if next_position is not None else None
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/audit/query")
+async def query_audit_trail(
+    event_type: Optional[str] = None,
+    actor: Optional[str] = None,
+    token_id: Optional[str] = None,
+    crop_id: Optional[str] = None,
+    settlement_id: Optional[str] = None,
+    bid_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    proofs: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Search the audit trail through its indexes, one page at a time"""
     try:
-        trail = CropTokenizationService.get_audit_trail()
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and (not isinstance(after, int) or after < 0):
+            raise ValueError("Invalid cursor")
+        filters = {
+            "event_type": event_type,
+            "actor": actor,
+            "token_id": token_id,
+            "crop_id": crop_id,
+            "settlement_id": settlement_id,
+            "bid_id": bid_id
+        }
+        body, next_after = await run_read(
+            CropTokenizationService.query_audit, filters, since, until, after, limit, proofs
+        )
         return {
             "success": True,
-            "audit_trail": trail,
-            "total_events": len(trail)
+            **body,
+            "next_cursor": encode_cursor(next_after) if next_after is not None else None
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/audit/verify")
-async def verify_audit_trail():
-    """Verify integrity of audit trail"""
+async def verify_audit_trail(full: bool = False, workers: int = Query(0, ge=0, le=64)):
+    """Verify integrity of audit trail (incrementally unless full=true or workers > 0)"""
+    try:
+        if workers:
+            result = await run_read(CropTokenizationService.verify_audit_parallel, workers)
+            if not result.get('success', True):
+                raise HTTPException(status_code=409, detail=result['message'])
+            return result
+        result = await run_read(CropTokenizationService.verify_audit_integrity, full)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/audit/merkle/root")
+async def get_audit_merkle_root():
+    """Get the Merkle root over the audit log"""
+    try:
+        return await run_read(CropTokenizationService.get_audit_root)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/audit/merkle/proof/{event_id}")
+async def get_audit_inclusion_proof(event_id: str, tree_size: Optional[int] = None):
+    """Get the inclusion proof for one audit event"""
     try:
-        result = CropTokenizationService.verify_audit_integrity()
+        result = await run_read(CropTokenizationService.get_inclusion_proof, event_id, tree_size)
+        if not result['success']:
+            raise HTTPException(status_code=404, detail=result['message'])
         return result
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/audit/merkle/consistency")
+async def get_audit_consistency_proof(first: int, second: Optional[int] = None):
+    """Get the consistency proof between two audit tree sizes"""
+    try:
+        return await run_read(CropTokenizationService.get_consistency_proof, first, second)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# === LIVE EVENTS ===
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    farmer_id: Optional[str] = None,
+    buyer_id: Optional[str] = None,
+    token_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    last_event_id: Optional[str] = None
+):
+    """Server-sent stream of new audit events, optionally filtered
+
+    `event_type` takes a comma-separated list. Reconnecting clients send
+    Last-Event-ID (or `last_event_id`) to replay the events they missed.
+    """
+    filters = {
+        "farmer_id": farmer_id,
+        "buyer_id": buyer_id,
+        "token_id": token_id,
+        "event_types": {t.strip() for t in event_type.split(",") if t.strip()} if event_type else None
+    }
+    resume = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_broker.stream(filters, resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # === DASHBOARD STATS ===
 
+def _stats_response(if_none_match: Optional[str]):
+    """Statistics body, cached per version of the saved totals"""
+    return response_cache.respond(
+        if_none_match, "stats", stats.version(), lambda: {"success": True, "stats": stats.summary()}
+    )
+
 @app.get("/api/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """Get system statistics"""
     try:
-        crops = load_crops()
-        tokens = load_tokens()
-        settlements = load_settlements()
-        
-        token_status_count = {}
-        for token in tokens:
-            status = token['status']
-            token_status_count[status] = token_status_count.get(status, 0) + 1
-        
-        total_volume = sum(s['total_amount'] for s in settlements)
-        
-        return {
-            "success": True,
-            "stats": {
-                "total_crops": len(crops),
-                "total_tokens": len(tokens),
-                "total_settlements": len(settlements),
-                "token_status_breakdown": token_status_count,
-                "total_settlement_volume": total_volume,
-                "avg_settlement_value": total_volume / len(settlements) if settlements else 0
-            }
-        }
+        return await run_read(_stats_response, request.headers.get("if-none-match"))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/stats/rebuild")
+async def rebuild_stats():
+    """Recompute statistics from scratch"""
+    try:
+        return {"success": True, "stats": await run_write(stats.rebuild)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -213,18 +648,15 @@ async def get_stats():
 async def get_compliance_report():
     """Generate compliance report"""
     try:
-        audit_verification = CropTokenizationService.verify_audit_integrity()
-        crops = load_crops()
-        tokens = load_tokens()
-        settlements = load_settlements()
-        
+        audit_verification = await run_read(CropTokenizationService.verify_audit_integrity)
+        audit_root = await run_read(CropTokenizationService.get_audit_root)
+        figures = await run_read(stats.compliance)
         return {
             "success": True,
             "compliance_report": {
                 "audit_trail_integrity": audit_verification,
-                "total_registered_farmers": len(set(c['farmer_id'] for c in crops)),
-                "total_active_tokens": len([t for t in tokens if t['status'] in ['CREATED', 'LISTED']]),
-                "total_completed_settlements": len([s for s in settlements if s['settlement_status'] == 'COMPLETED']),
+                "audit_merkle_root": audit_root['root_hash'],
+                **figures,
                 "regulatory_notes": [
                     "No real financial transactions executed",
                     "All settlements are simulated",
@@ -239,4 +671,9 @@ async def get_compliance_report():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from config import WORKERS
+    if WORKERS > 1:
+        # Each worker imports the app itself; storage coordinates them through file locks
+        uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,166 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import merge
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils import scan_audit_log, read_audit_after
+
+# Fields of an entry's data naming the record the event is about
+AUDIT_ENTITY_FIELDS = ("token_id", "crop_id", "settlement_id", "bid_id")
+# Every field the audit query can filter on
+AUDIT_QUERY_FIELDS = ("event_type", "actor") + AUDIT_ENTITY_FIELDS
+
+
+def _timestamp(value) -> Optional[float]:
+    """Seconds since the epoch of a stored or requested (naive local) time"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        # Entries carry naive local timestamps
+        if value.tzinfo:
+            value = value.astimezone().replace(tzinfo=None)
+        return value.timestamp()
+    return None
+
+
+def _contains(postings: array, index: int) -> bool:
+    i = bisect_left(postings, index)
+    return i < len(postings) and postings[i] == index
+
+
+class AuditQueryIndex:
+    """Secondary indexes over the audit log, kept in step with storage
+
+    For each event type, actor and entity id (data.token_id, crop_id,
+    settlement_id, bid_id) the index holds the log indexes of the entries
+    carrying it, in log order, as compact integer arrays. Timestamps sit in
+    a parallel array; entries are logged in time order, so a time range is
+    an index range found by bisection. Like the Merkle index it is built on
+    first use and afterwards only reads entries appended since the last
+    sync. Matching entries are fetched from storage by position.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, array]] = {f: {} for f in AUDIT_QUERY_FIELDS}
+        self._times = array('d')
+        self._starts = array('q')  # scan position preceding each entry
+        self._in_order = True  # False once a timestamp goes backwards
+        self._position = None
+
+    def sync(self):
+        """Index any audit entries appended since the last sync"""
+        with self._lock:
+            for position, entry in scan_audit_log(self._position):
+                index = len(self._starts)
+                self._starts.append(self._position or 0)
+                self._position = position
+                data = entry.get('data') or {}
+                for field in AUDIT_QUERY_FIELDS:
+                    value = entry.get(field) if field in ("event_type", "actor") else data.get(field)
+                    if not isinstance(value, str):
+                        continue
+                    postings = self._postings[field].get(value)
+                    if postings is None:
+                        postings = self._postings[field][value] = array('I')
+                    postings.append(index)
+                last = self._times[-1] if self._times else 0.0
+                timestamp = _timestamp(entry.get('timestamp'))
+                if timestamp is None:
+                    timestamp = last
+                elif timestamp < last:
+                    self._in_order = False
+                self._times.append(timestamp)
+
+    def tail(self) -> Tuple[int, object]:
+        """(entries indexed, scan position after the last of them)"""
+        with self._lock:
+            self.sync()
+            return len(self._starts), self._position
+
+    def position_before(self, index: int):
+        """Scan position preceding the entry at a log index"""
+        with self._lock:
+            self.sync()
+            return self._starts[index] if index < len(self._starts) else self._position
+
+    def search(self, filters: Dict[str, Optional[str]], since: Optional[datetime] = None,
+               until: Optional[datetime] = None, after: Optional[int] = None,
+               limit: int = 100) -> Tuple[List[int], Optional[int]]:
+        """Log indexes of up to `limit` entries matching every filter, plus the next `after`
+
+        Filters map fields of AUDIT_QUERY_FIELDS to values; None values are
+        ignored. The shortest posting list drives the search and the others
+        are probed by bisection, so the cost follows the rarest filter.
+        """
+        with self._lock:
+            self.sync()
+            lists = []
+            for field, value in filters.items():
+                if value is None:
+                    continue
+                if field not in self._postings:
+                    raise ValueError(f"Audit entries are not indexed by {field}")
+                postings = self._postings[field].get(value)
+                if not postings:
+                    return [], None
+                lists.append(postings)
+            lists.sort(key=len)
+
+            start, stop = 0, len(self._starts)
+            low, high = _timestamp(since), _timestamp(until)
+            if self._in_order:
+                if low is not None:
+                    start = bisect_left(self._times, low)
+                if high is not None:
+                    stop = bisect_right(self._times, high)
+            check_time = not self._in_order and (low is not None or high is not None)
+            if after is not None:
+                start = max(start, after + 1)
+
+            if lists:
+                driver, rest = lists[0], lists[1:]
+                candidates = (driver[i] for i in range(bisect_left(driver, start), len(driver)))
+            else:
+                rest = []
+                candidates = iter(range(start, stop))
+
+            hits = []
+            for index in candidates:
+                if index >= stop:
+                    break
+                if check_time:
+                    timestamp = self._times[index]
+                    if (low is not None and timestamp < low) or (high is not None and timestamp > high):
+                        continue
+                if all(_contains(postings, index) for postings in rest):
+                    hits.append(index)
+                    if len(hits) > limit:
+                        return hits[:limit], hits[limit - 1]
+            return hits, None
+
+    def history(self, keys: Iterable[Tuple[str, str]]) -> List[int]:
+        """Log indexes of every entry carrying any of the (field, value) keys, in log order"""
+        with self._lock:
+            self.sync()
+            lists = [self._postings[field].get(value, ()) for field, value in keys]
+            indexes = []
+            for index in merge(*lists):
+                if not indexes or indexes[-1] != index:
+                    indexes.append(index)
+            return indexes
+
+    def entries(self, indexes: List[int]) -> List[Optional[Dict]]:
+        """The entries at the given log indexes, read from storage by position"""
+        with self._lock:
+            self.sync()
+            afters = [self._starts[i] for i in indexes]
+        return read_audit_after(afters)
+
+
+# Shared instance used by the service layer
+audit_index = AuditQueryIndex()
@@ -0,0 +1,9 @@
+"""Benchmarks for the register -> list -> settle lifecycle
+
+Run from the backend directory:
+    python -m benchmarks [--sizes 1000,10000] [--mode inprocess|http|both] ...
+
+Each dataset size is seeded into its own scratch data directory and measured
+in a fresh process, so the module-level stores and caches start cold. See
+`python -m benchmarks --help` for every option.
+"""
@@ -0,0 +1,5 @@
+from benchmarks.runner import main
+
+# Everything a spawned worker needs lives in benchmarks.runner, since
+# multiprocessing does not re-import a package's __main__ in its children
+main()
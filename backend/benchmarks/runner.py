@@ -0,0 +1,200 @@
+"""Seeds datasets, runs the scenarios in fresh processes and writes the results"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _scratch_env(data_dir: str, backend: str) -> Dict[str, str]:
+    return {
+        "DHARA_DATA_DIR": data_dir,
+        "DHARA_SQLITE_PATH": os.path.join(data_dir, "dhara.db"),
+        "DHARA_STORAGE_BACKEND": backend
+    }
+
+
+def _set_env(env: Dict[str, str]):
+    os.environ.update(env)
+
+
+def _in_fresh_process(env: Dict[str, str], fn, *args):
+    """Run fn(*args) in a new interpreter whose stores open the given data directory"""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, initializer=_set_env, initargs=(env,)) as pool:
+        return pool.apply(fn, args)
+
+
+def _seed_and_time(size: int) -> float:
+    from benchmarks.seed import seed
+
+    started = time.perf_counter()
+    seed(size)
+    return round(time.perf_counter() - started, 3)
+
+
+def _inprocess_and_storage(rounds: int, concurrency: int, farmers: int, storage_iterations: int) -> Dict:
+    from benchmarks.scenario import run_inprocess
+    from benchmarks.storage_ops import time_storage_ops
+
+    result = run_inprocess(rounds, concurrency, farmers)
+    # Storage writes go last so they cannot disturb the endpoint numbers
+    return {"inprocess": result, "storage_ops": time_storage_ops(storage_iterations)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(env: Dict[str, str], workers: int) -> tuple:
+    """Launch uvicorn on a free local port and wait until it answers"""
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            httpx.get(url + "/", timeout=1)
+            return server, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Server did not start within 60 seconds")
+
+
+def _copy_dataset(source: str, workdir: str, name: str) -> str:
+    target = os.path.join(workdir, name)
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(source, target)
+    return target
+
+
+def run_size(size: int, args) -> Dict:
+    """Seed one dataset size and measure it in every requested mode"""
+    from config import DATA_DIR
+
+    seeded = os.path.join(args.workdir, f"seed-{args.backend}-{size}")
+    shutil.rmtree(seeded, ignore_errors=True)
+    os.makedirs(seeded)
+    shutil.copy(os.path.join(DATA_DIR, "prices.json"), seeded)
+    print(f"[{size}] seeding {size} crops ({args.backend})", flush=True)
+    run = {"size": size, "seed_seconds": _in_fresh_process(_scratch_env(seeded, args.backend), _seed_and_time, size)}
+    farmers = max(1, size // 10)
+
+    if args.mode in ("inprocess", "both"):
+        print(f"[{size}] in-process: {args.requests} rounds x {args.concurrency} threads", flush=True)
+        data_dir = _copy_dataset(seeded, args.workdir, f"inprocess-{args.backend}-{size}")
+        run.update(_in_fresh_process(
+            _scratch_env(data_dir, args.backend), _inprocess_and_storage,
+            args.requests, args.concurrency, farmers, args.storage_iterations
+        ))
+
+    if args.mode in ("http", "both"):
+        from benchmarks.scenario import run_http
+
+        print(f"[{size}] http: {args.requests} rounds, {args.concurrency} in flight", flush=True)
+        if args.url:
+            run["http"] = run_http(args.url, args.requests, args.concurrency, farmers)
+        else:
+            data_dir = _copy_dataset(seeded, args.workdir, f"http-{args.backend}-{size}")
+            server, url = _start_server(_scratch_env(data_dir, args.backend), args.server_workers)
+            try:
+                run["http"] = run_http(url, args.requests, args.concurrency, farmers)
+            finally:
+                server.terminate()
+                server.wait(30)
+            run["http"]["server_workers"] = args.server_workers
+    return run
+
+
+def _print_summary(runs: List[Dict]):
+    for run in runs:
+        print(f"\n== {run['size']} crops (seeded in {run['seed_seconds']}s) ==")
+        for mode in ("inprocess", "http"):
+            if mode not in run:
+                continue
+            result = run[mode]
+            print(f"{mode}: {result['throughput_rps']} req/s over {result['requests']} requests")
+            for endpoint, figures in result['endpoints'].items():
+                print(f"  {endpoint:34} p50 {figures['p50_ms']:>9} ms  p95 {figures['p95_ms']:>9} ms"
+                      f"  p99 {figures['p99_ms']:>9} ms  errors {figures['errors']}")
+        if "storage_ops" in run:
+            print("storage:")
+            for op, figures in run['storage_ops'].items():
+                print(f"  {op:34} p50 {figures['p50_ms']:>9} ms  p99 {figures['p99_ms']:>9} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark the register -> list -> settle lifecycle")
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="comma separated dataset sizes in crops (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--mode", choices=["inprocess", "http", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=200, help="lifecycle rounds per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="rounds in flight at once")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn workers for the http mode")
+    parser.add_argument("--storage-iterations", type=int, default=200,
+                        help="calls per point operation in the storage timings")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--workdir", help="where scratch data directories go (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch data directories")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    if args.mode != "inprocess":
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            parser.error("the http mode needs httpx (pip install httpx)")
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    created = args.workdir is None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="dhara-bench-")
+    os.makedirs(args.workdir, exist_ok=True)
+
+    started = datetime.now()
+    try:
+        runs = [run_size(size, args) for size in sizes]
+    finally:
+        if created and not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "started_at": started.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "backend": args.backend,
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "runs": runs
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    _print_summary(runs)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,126 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+from benchmarks.seed import crop_request
+from benchmarks.stats import summarize
+
+
+class LatencyRecorder:
+    """Request durations and failures per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, endpoint: str, seconds: float, status: int):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed: float, rounds: int, concurrency: int) -> Dict:
+        requests = sum(len(s) for s in self.samples.values())
+        return {
+            "rounds": rounds,
+            "concurrency": concurrency,
+            "requests": requests,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+            "rounds_per_second": round(rounds / elapsed, 1) if elapsed else 0.0,
+            "endpoints": {
+                name: {**summarize(samples), "errors": self.errors.get(name, 0)}
+                for name, samples in sorted(self.samples.items())
+            }
+        }
+
+
+def lifecycle(rng: random.Random, farmers: int) -> Iterator[tuple]:
+    """One register -> list -> settle round plus the reads a dashboard makes
+
+    Yields (method, endpoint, path, request kwargs); the driver sends back
+    the decoded JSON reply.
+    """
+    reply = yield ("POST", "POST /api/crops/register", "/api/crops/register",
+                   {"json": crop_request(rng, farmers)})
+    token = reply['token']
+    yield ("POST", "POST /api/tokens/list", "/api/tokens/list",
+           {"json": {"token_id": token['token_id'], "seller_id": token['owner_id']}})
+    yield ("GET", "GET /api/tokens/{token_id}", f"/api/tokens/{token['token_id']}", {})
+    yield ("GET", "GET /api/tokens/query", "/api/tokens/query",
+           {"params": {"status": "LISTED", "crop_type": reply['crop']['crop_type'],
+                       "mandi_id": reply['crop']['mandi_id'], "limit": 20}})
+    yield ("POST", "POST /api/settlements/execute", "/api/settlements/execute",
+           {"json": {"token_id": token['token_id'], "buyer_id": f"BENCH-B{rng.randrange(farmers)}"}})
+    yield ("GET", "GET /api/crops?limit=100", "/api/crops", {"params": {"limit": 100}})
+    yield ("GET", "GET /api/stats", "/api/stats", {})
+    yield ("GET", "GET /api/audit/verify", "/api/audit/verify", {})
+
+
+def _reply(response) -> Dict:
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def run_inprocess(rounds: int, concurrency: int, farmers: int, rng_seed: int = 7) -> Dict:
+    """Drive the app through FastAPI's TestClient from `concurrency` threads"""
+    from fastapi.testclient import TestClient
+    from app import app
+
+    recorder = LatencyRecorder()
+
+    def one_round(client, seed):
+        steps = lifecycle(random.Random(seed), farmers)
+        reply = None
+        try:
+            while True:
+                method, endpoint, path, kwargs = steps.send(reply)
+                started = time.perf_counter()
+                response = client.request(method, path, **kwargs)
+                recorder.add(endpoint, time.perf_counter() - started, response.status_code)
+                reply = _reply(response)
+        except StopIteration:
+            pass
+
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda i: one_round(client, rng_seed + i), range(rounds)))
+        elapsed = time.perf_counter() - started
+    return recorder.report(elapsed, rounds, concurrency)
+
+
+def run_http(base_url: str, rounds: int, concurrency: int, farmers: int, rng_seed: int = 7) -> Dict:
+    """Drive a running server over HTTP with `concurrency` requests in flight"""
+    import httpx
+
+    recorder = LatencyRecorder()
+
+    async def one_round(client, gate, seed):
+        async with gate:
+            steps = lifecycle(random.Random(seed), farmers)
+            reply = None
+            try:
+                while True:
+                    method, endpoint, path, kwargs = steps.send(reply)
+                    started = time.perf_counter()
+                    response = await client.request(method, path, **kwargs)
+                    recorder.add(endpoint, time.perf_counter() - started, response.status_code)
+                    reply = _reply(response)
+            except StopIteration:
+                pass
+
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await asyncio.gather(*(one_round(client, gate, rng_seed + i) for i in range(rounds)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return recorder.report(time.perf_counter() - started, rounds, concurrency)
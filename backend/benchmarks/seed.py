@@ -0,0 +1,49 @@
+import random
+from typing import Dict, List
+
+# Registrations sent per batch call while seeding
+SEED_BATCH = 1000
+CROP_TYPES = ("wheat", "rice", "cotton")
+MANDIS = ("PUNE-MKT-01", "MUMBAI-MKT-02", "NASHIK-MKT-03")
+
+
+def crop_request(rng: random.Random, farmers: int) -> Dict:
+    """Random but valid registration payload"""
+    return {
+        "farmer_id": f"BENCH-F{rng.randrange(farmers)}",
+        "crop_type": rng.choice(CROP_TYPES),
+        "quantity": float(rng.randint(100, 5000)),
+        "quality_grade": rng.choice("ABC"),
+        "mandi_id": rng.choice(MANDIS)
+    }
+
+
+def seed(size: int, rng_seed: int = 42) -> Dict:
+    """Fill the configured data directory through the service layer
+
+    Registers `size` crops (one token and two audit events each), lists half
+    of the tokens and settles half of those, so every collection and status
+    is represented.
+    """
+    from models import TokenListingRequest
+    from services import CropTokenizationService, MAX_TRADE_BATCH_SIZE
+
+    rng = random.Random(rng_seed)
+    farmers = max(1, size // 10)
+    tokens: List[tuple] = []
+    for start in range(0, size, SEED_BATCH):
+        items = [crop_request(rng, farmers) for _ in range(min(SEED_BATCH, size - start))]
+        result = CropTokenizationService.register_crops_batch(items)
+        tokens += [(r['token_id'], items[r['index']]['farmer_id']) for r in result['results'] if r['success']]
+
+    listed = tokens[::2]
+    for token_id, farmer_id in listed:
+        CropTokenizationService.list_token(TokenListingRequest(token_id=token_id, seller_id=farmer_id))
+
+    sold = listed[::2]
+    for start in range(0, len(sold), MAX_TRADE_BATCH_SIZE):
+        CropTokenizationService.execute_trades_batch([
+            {"token_id": token_id, "buyer_id": f"BENCH-B{rng.randrange(farmers)}"}
+            for token_id, _ in sold[start:start + MAX_TRADE_BATCH_SIZE]
+        ])
+    return {"crops": size, "listed": len(listed), "settled": len(sold)}
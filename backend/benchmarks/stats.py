@@ -0,0 +1,24 @@
+from typing import Dict, List
+
+# Percentiles reported for every timed operation
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Count, mean and percentiles of durations in seconds, reported in ms"""
+    ordered = sorted(samples)
+    summary = {
+        "calls": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(ordered, pct) * 1000, 3)
+    return summary
@@ -0,0 +1,58 @@
+import random
+import time
+from typing import Callable, Dict
+from benchmarks.stats import summarize
+
+
+def _timed(fn: Callable, repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def time_storage_ops(iterations: int, rng_seed: int = 11) -> Dict:
+    """Per-call timings of the utils.py storage functions on the current data
+
+    Whole-collection reads run a few times, point operations (including
+    the repository's keyed lookups) `iterations` times. Writes add standalone crops and no-op token updates; the audit
+    chain is only ever extended through the service layer.
+    """
+    import utils
+    from repository import repository
+
+    rng = random.Random(rng_seed)
+    crops = utils.load_crops()
+    tokens = utils.load_tokens()
+    bulk = max(1, min(5, iterations // 20))
+    crop_ids = [c['crop_id'] for c in crops] or ["missing"]
+    token_ids = [(t['token_id'], t['status']) for t in tokens] or [("missing", "CREATED")]
+
+    def new_crop():
+        return {
+            "crop_id": utils.generate_id("CROP_BENCH"), "crop_type": "wheat", "quantity": 100.0,
+            "quality_grade": "A", "mandi_id": "PUNE-MKT-01", "farmer_id": "BENCH-STORAGE",
+            "timestamp": "2026-01-01 00:00:00"
+        }
+
+    def touch_token():
+        token_id, status = rng.choice(token_ids)
+        utils.append_token_update(token_id, {"status": status})
+
+    return {
+        "load_crops": _timed(utils.load_crops, bulk),
+        "load_tokens": _timed(utils.load_tokens, bulk),
+        "load_settlements": _timed(utils.load_settlements, bulk),
+        "load_audit_log": _timed(utils.load_audit_log, bulk),
+        "get_crop": _timed(lambda: repository.get_crop(rng.choice(crop_ids)), iterations),
+        "get_token": _timed(lambda: repository.get_token(rng.choice(token_ids)[0]), iterations),
+        "load_last_audit_entry": _timed(utils.load_last_audit_entry, iterations),
+        "scan_audit_log_100": _timed(lambda: [e for _, e in zip(range(100), utils.scan_audit_log())], iterations),
+        "get_price": _timed(lambda: utils.get_price("wheat", "PUNE-MKT-01"), iterations),
+        "generate_id": _timed(lambda: utils.generate_id("BENCH"), iterations),
+        "save_crop": _timed(lambda: utils.save_crop(new_crop()), iterations),
+        "save_crops_100": _timed(lambda: utils.save_crops([new_crop() for _ in range(100)]), bulk),
+        "append_token_update": _timed(touch_token, iterations)
+    }
@@ -0,0 +1,50 @@
+import os
+
+# Runtime settings, overridable through environment variables
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("DHARA_DATA_DIR", os.path.join(os.path.dirname(BASE_DIR), "data"))
+
+# Storage backend: "json" (JSON Lines logs in DATA_DIR) or "sqlite"
+STORAGE_BACKEND = os.environ.get("DHARA_STORAGE_BACKEND", "json").lower()
+SQLITE_PATH = os.environ.get("DHARA_SQLITE_PATH", os.path.join(DATA_DIR, "dhara.db"))
+
+# Price oracle: seconds between change checks, and age after which a tick is stale
+PRICE_CACHE_TTL = float(os.environ.get("DHARA_PRICE_CACHE_TTL", "1.0"))
+PRICE_MAX_AGE = float(os.environ["DHARA_PRICE_MAX_AGE"]) if os.environ.get("DHARA_PRICE_MAX_AGE") else None
+
+# Audit entries per segment of the JSON backend's audit log
+AUDIT_SEGMENT_SIZE = int(os.environ.get("DHARA_AUDIT_SEGMENT_SIZE", "10000"))
+
+# Operations a collection log (JSON backend) may hold before it is folded into
+# a snapshot; bounds how much of it a restart has to replay
+SNAPSHOT_AFTER = int(os.environ.get("DHARA_SNAPSHOT_AFTER", "10000"))
+
+# fsync every append (JSON backend); otherwise only snapshots and rewrites are
+# synced, which survives a process crash but not a power loss
+SYNC_WRITES = os.environ.get("DHARA_SYNC_WRITES", "").lower() in ("1", "true", "yes")
+
+# Threads serving blocking storage reads; writes run one at a time on their own thread
+IO_THREADS = int(os.environ.get("DHARA_IO_THREADS", "8"))
+
+# Server worker processes started by `python app.py`; they share DATA_DIR safely
+WORKERS = int(os.environ.get("DHARA_WORKERS", "1"))
+
+# Most processes a parallel audit verification may use (`?workers=N` is capped to it)
+VERIFY_WORKERS = max(1, int(os.environ.get("DHARA_VERIFY_WORKERS", "4")))
+
+# Node number embedded in generated ids; defaults to the process id, which is
+# unique among the workers sharing a host. Set it when several hosts share data.
+NODE_ID = int(os.environ["DHARA_NODE_ID"]) if os.environ.get("DHARA_NODE_ID") else None
+
+# Memory, in MB, for serialized bodies of unchanged GET responses
+RESPONSE_CACHE_MB = float(os.environ.get("DHARA_RESPONSE_CACHE_MB", "64"))
+
+# Requests slower than this many milliseconds are logged with a per-operation
+# breakdown; unset to disable the slow-request log
+SLOW_REQUEST_MS = float(os.environ["DHARA_SLOW_REQUEST_MS"]) if os.environ.get("DHARA_SLOW_REQUEST_MS") else None
+
+# Live event stream: events a subscriber may fall behind before it is cut off
+# (it can resume with Last-Event-ID), and seconds between checks for events
+# written by other server workers
+SSE_BUFFER_EVENTS = int(os.environ.get("DHARA_SSE_BUFFER", "1000"))
+SSE_POLL_SECONDS = float(os.environ.get("DHARA_SSE_POLL_SECONDS", "1.0"))
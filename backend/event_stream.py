@@ -0,0 +1,202 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from audit_index import audit_index
+from merkle import audit_tree
+from executor import run_read
+from utils import scan_audit_log
+from config import SSE_BUFFER_EVENTS, SSE_POLL_SECONDS
+
+# Seconds of silence after which a comment keeps idle connections open
+KEEPALIVE_SECONDS = 15.0
+# Audit entries read from storage per step of the pump or of a replay
+READ_CHUNK = 1000
+
+
+def matches(filters: Dict, entry: Dict) -> bool:
+    """Whether an audit entry passes a subscriber's filters
+
+    A farmer or buyer matches events they acted in and settlements where
+    they were the seller or buyer.
+    """
+    data = entry.get('data') or {}
+    event_types = filters.get('event_types')
+    if event_types and entry.get('event_type') not in event_types:
+        return False
+    farmer_id = filters.get('farmer_id')
+    if farmer_id and farmer_id not in (entry.get('actor'), data.get('seller')):
+        return False
+    buyer_id = filters.get('buyer_id')
+    if buyer_id and buyer_id not in (entry.get('actor'), data.get('buyer')):
+        return False
+    token_id = filters.get('token_id')
+    if token_id and data.get('token_id') != token_id:
+        return False
+    return True
+
+
+def _message(entry: Dict) -> str:
+    """An audit entry as an SSE message whose id is the event id"""
+    data = json.dumps(entry, default=str, separators=(',', ':'))
+    return f"id: {entry['event_id']}\ndata: {data}\n\n"
+
+
+def _read(after, limit: int) -> Tuple[List[Dict], object]:
+    """Up to `limit` audit entries after a scan position, and the position after them"""
+    entries = []
+    position = after
+    for position, entry in scan_audit_log(after):
+        entries.append(entry)
+        if len(entries) == limit:
+            break
+    return entries, position
+
+
+class Subscription:
+    """One client's filtered feed, buffered in a bounded queue"""
+
+    def __init__(self, filters: Dict, max_events: int, start: int):
+        self.filters = filters
+        self.queue: asyncio.Queue = asyncio.Queue(max_events)
+        # Log index of the first event delivered live; earlier ones come from a replay
+        self.start = start
+        self.overflowed = False
+
+    def offer(self, index: int, entry: Dict) -> bool:
+        """Queue an event if it matches; False once the buffer has overflowed"""
+        if not matches(self.filters, entry):
+            return True
+        try:
+            self.queue.put_nowait((index, entry))
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+class EventBroker:
+    """Fans new audit entries out to live subscribers
+
+    One pump per server worker follows the audit log from its end. The
+    service layer wakes it right after logging events, and it polls every
+    `poll_seconds` for entries other workers appended, so every worker
+    streams every event. A subscriber that falls `max_events` behind is cut
+    off with an `overflow` message instead of growing without bound; on
+    reconnect its Last-Event-ID replays what it missed from the log.
+    """
+
+    def __init__(self, max_events: int, poll_seconds: float):
+        self.max_events = max_events
+        self.poll_seconds = poll_seconds
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._starting: Optional[asyncio.Lock] = None
+        self._position = None
+        self._next_index = 0
+
+    def notify(self):
+        """Wake the pump; safe from any thread and a no-op until it runs"""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None:
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass  # the event loop has shut down
+
+    async def start(self):
+        """Start the pump at the current end of the log, once"""
+        if self._task is not None:
+            return
+        if self._starting is None:
+            self._starting = asyncio.Lock()
+        async with self._starting:
+            if self._task is not None:
+                return
+            self._next_index, self._position = await run_read(audit_index.tail)
+            self._wake = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._pump())
+
+    async def stop(self):
+        """Stop the pump; subscribers see no further events"""
+        task, self._task = self._task, None
+        self._loop = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _pump(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                entries, position = await run_read(_read, self._position, READ_CHUNK)
+            except Exception as e:
+                print(f"Event stream could not read the audit log: {e}")
+                continue
+            if len(entries) == READ_CHUNK:
+                self._wake.set()  # more are waiting
+            self._position = position
+            for entry in entries:
+                index = self._next_index
+                self._next_index += 1
+                for subscription in list(self._subscribers):
+                    if not subscription.offer(index, entry):
+                        self._subscribers.discard(subscription)
+
+    def subscribe(self, filters: Dict) -> Subscription:
+        """Register a subscriber for events from now on"""
+        subscription = Subscription(filters, self.max_events, self._next_index)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def stream(self, filters: Dict, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        """SSE messages for one client: a replay after `last_event_id`, then live events"""
+        await self.start()
+        subscription = self.subscribe(filters)
+        try:
+            last = subscription.start - 1
+            index = await run_read(audit_tree.index_of, last_event_id) if last_event_id else None
+            if index is not None and index < last:
+                # Read the gap from the log while live events queue up behind it
+                position = await run_read(audit_index.position_before, index + 1)
+                while index < last:
+                    entries, position = await run_read(_read, position, min(READ_CHUNK, last - index))
+                    if not entries:
+                        break
+                    for entry in entries:
+                        index += 1
+                        if matches(filters, entry):
+                            yield _message(entry)
+
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    yield f"event: overflow\ndata: {json.dumps({'buffer': self.max_events})}\n\n"
+                    return
+                try:
+                    index, entry = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if index <= last:
+                    continue
+                last = index
+                yield _message(entry)
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Shared instance; the service layer wakes it and /api/events streams from it
+event_broker = EventBroker(SSE_BUFFER_EVENTS, SSE_POLL_SECONDS)
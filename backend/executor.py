@@ -0,0 +1,29 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from config import IO_THREADS
+
+# Blocking reads share a bounded pool; every mutation goes through a single
+# writer thread, so writes are applied one at a time in arrival order and a
+# read-check-write in the service layer can never interleave with another.
+_readers = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="dhara-read")
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dhara-write")
+
+
+async def _submit(pool: ThreadPoolExecutor, fn: Callable, args: tuple, kwargs: dict) -> Any:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pool, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def run_read(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking read off the event loop"""
+    return await _submit(_readers, fn, args, kwargs)
+
+
+async def run_write(fn: Callable, *args, **kwargs) -> Any:
+    """Queue a mutation on the single writer thread and wait for its result"""
+    return await _submit(_writer, fn, args, kwargs)
+
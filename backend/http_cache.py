@@ -0,0 +1,80 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+# Lets clients keep a copy but makes them revalidate it on every use
+CACHE_CONTROL = "no-cache"
+
+
+def render_json(payload: Any) -> bytes:
+    """Serialize a payload exactly as FastAPI's JSONResponse would"""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the given entity tag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ResponseCache:
+    """Serialized JSON bodies of GET responses, keyed by the data version they show
+
+    An entry is only served while the version it was built for is current,
+    so any write, by this or another worker, invalidates it. The ETag is a
+    hash of the body, which makes it the same on every worker. Least
+    recently used entries are dropped once the bodies exceed `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, str, bytes]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Tuple[str, bytes]]:
+        """(etag, body) cached for `key` at `version`"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: Any, body: bytes) -> str:
+        """Cache a body for `key` at `version` and return its ETag"""
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if version is None or len(body) > self.max_bytes:
+            return etag
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[2])
+            self._entries[key] = (version, etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return etag
+
+    def respond(self, if_none_match: Optional[str], key: Hashable, version: Any,
+                build: Callable[[], Any]) -> Response:
+        """304 if the client's copy is current, else the cached or freshly built body"""
+        cached = self.get(key, version)
+        if cached is None:
+            body = render_json(build())
+            cached = self.put(key, version, body), body
+        etag, body = cached
+        headers: Dict[str, str] = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
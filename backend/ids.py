@@ -0,0 +1,58 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Digits reserved for the node number and the per-microsecond sequence
+NODE_DIGITS = 7
+SEQ_DIGITS = 3
+_MAX_SEQ = 10 ** SEQ_DIGITS - 1
+_STEP = timedelta(microseconds=1)
+
+
+class IdAllocator:
+    """Unique, time-ordered ids: PREFIX_{timestamp}{node}{sequence}
+
+    The timestamp has microsecond precision and never goes backwards within
+    a process, the node number separates processes (and hosts, when set
+    explicitly) and the sequence separates ids issued within the same
+    microsecond. All parts are fixed width, so ids with the same prefix sort
+    by creation time.
+    """
+
+    def __init__(self, node_id: Optional[int] = None):
+        if node_id is not None and not 0 <= node_id < 10 ** NODE_DIGITS:
+            raise ValueError(f"Node id must have at most {NODE_DIGITS} digits")
+        self._node_id = node_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last = None
+        self._seq = 0
+
+    def _node(self) -> int:
+        if self._node_id is not None:
+            return self._node_id
+        return os.getpid() % 10 ** NODE_DIGITS
+
+    def next(self, prefix: str) -> str:
+        """Allocate the next id for a prefix"""
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # Fresh process (or a fork): new node number, fresh sequence
+                self._pid = pid
+                self._last = None
+                self._seq = 0
+            now = datetime.now()
+            if self._last is None or now > self._last:
+                self._last = now
+                self._seq = 0
+            elif self._seq < _MAX_SEQ:
+                self._seq += 1
+            else:
+                # Sequence exhausted (or the clock stepped back): borrow the next microsecond
+                self._last += _STEP
+                self._seq = 0
+            node = self._node()
+            return (f"{prefix}_{self._last.strftime('%Y%m%d%H%M%S%f')}"
+                    f"{node:0{NODE_DIGITS}d}{self._seq:0{SEQ_DIGITS}d}")
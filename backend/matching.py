@@ -0,0 +1,206 @@
+import heapq
+import threading
+from typing import Dict, List, Optional, Tuple
+from repository import repository
+from utils import load_bids, bids_version
+
+# Bid statuses that still take part in matching
+OPEN_BID_STATUS = "OPEN"
+
+
+def book_key(crop: Dict) -> Tuple[str, str, str]:
+    """Order book a crop trades in: (crop_type, mandi_id, quality_grade)"""
+    return crop['crop_type'], crop['mandi_id'], crop['quality_grade']
+
+
+class OrderBook:
+    """Standing bids and listed tokens of one (crop_type, mandi_id, quality_grade)
+
+    Bids sit in a max-heap on price, then placement time; listed tokens in
+    a min-heap on their reserve price, then listing time. Entries are never
+    removed from the middle of a heap: filled, cancelled or sold entries
+    stay until they reach the top and are dropped there.
+    """
+
+    def __init__(self):
+        # (-price_per_kg, placed_at, bid_id)
+        self.bids: List[tuple] = []
+        # (reserve_per_kg, listed_at, token_id)
+        self.asks: List[tuple] = []
+
+
+class MatchingEngine:
+    """Price-time priority matching of buyer bids against listed tokens
+
+    Every token is one indivisible lot, so a bid for `lots` tokens is
+    filled one whole token at a time. A trade happens whenever the best bid
+    pays at least the best token's reserve price, and settles at the bid
+    price. The engine only decides who trades with whom; the service layer
+    persists the settlements and updates it with what was written.
+
+    Matching must run inside the storage write transaction. The books are
+    rebuilt from the open bids and the listed tokens whenever another
+    worker changed either, so every worker matches against the same state.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._books: Dict[tuple, OrderBook] = {}
+        # Open bids by id; the heaps only hold references to them
+        self._bids: Dict[str, Dict] = {}
+        # Book of every resting token; sold tokens leave it when matched
+        self._asks: Dict[str, tuple] = {}
+
+    def _current_version(self) -> tuple:
+        return bids_version(), repository.generation()
+
+    def load(self):
+        """Rebuild every book from storage"""
+        with self._lock:
+            version = self._current_version()
+            self._books = {}
+            self._bids = {}
+            self._asks = {}
+            for bid in load_bids():
+                if bid['status'] == OPEN_BID_STATUS:
+                    self._rest_bid(bid)
+            for token in repository.find_tokens(status="LISTED"):
+                crop = repository.get_crop(token['linked_crop_id'])
+                if crop is not None:
+                    self._rest_ask(token, book_key(crop))
+            self._version = version
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded or self._current_version() != self._version:
+            self.load()
+
+    def invalidate(self):
+        """Rebuild on next use; call when persisting a match failed"""
+        with self._lock:
+            self._loaded = False
+
+    def written(self):
+        """Record our own bid or token writes as seen; call inside the transaction"""
+        with self._lock:
+            self._version = self._current_version()
+
+    def _book(self, key: tuple) -> OrderBook:
+        book = self._books.get(key)
+        if book is None:
+            book = self._books[key] = OrderBook()
+        return book
+
+    def _rest_bid(self, bid: Dict):
+        bid = dict(bid)
+        self._bids[bid['bid_id']] = bid
+        key = (bid['crop_type'], bid['mandi_id'], bid['quality_grade'])
+        heapq.heappush(self._book(key).bids, (-bid['price_per_kg'], bid['created_at'], bid['bid_id']))
+
+    def _rest_ask(self, token: Dict, key: tuple):
+        reserve = token.get('reserve_price_per_kg') or 0.0
+        listed_at = token.get('listed_at') or token['created_at']
+        self._asks[token['token_id']] = key
+        heapq.heappush(self._book(key).asks, (reserve, listed_at, token['token_id']))
+
+    def _best_bid(self, book: OrderBook) -> Optional[Dict]:
+        while book.bids:
+            bid = self._bids.get(book.bids[0][2])
+            if bid is not None and bid['filled'] < bid['lots']:
+                return bid
+            heapq.heappop(book.bids)
+        return None
+
+    def _best_ask(self, book: OrderBook) -> Optional[tuple]:
+        while book.asks:
+            reserve, _, token_id = book.asks[0]
+            token = repository.get_token(token_id)
+            # Tokens bought directly drop out here
+            if token_id in self._asks and token is not None and token['status'] == "LISTED":
+                return reserve, token
+            self._asks.pop(token_id, None)
+            heapq.heappop(book.asks)
+        return None
+
+    def match_listing(self, token: Dict, crop: Dict) -> Optional[Dict]:
+        """Best bid a newly listed token fills, or None after resting the token
+
+        The returned bid is already charged one lot.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            key = book_key(crop)
+            book = self._book(key)
+            reserve = token.get('reserve_price_per_kg') or 0.0
+            bid = self._best_bid(book)
+            if bid is None or bid['price_per_kg'] < reserve:
+                self._rest_ask(token, key)
+                return None
+            bid['filled'] += 1
+            if bid['filled'] >= bid['lots']:
+                del self._bids[bid['bid_id']]
+            return bid
+
+    def match_bid(self, bid: Dict) -> Tuple[List[Dict], Dict]:
+        """(tokens, bid): the listed tokens a new bid fills, best first
+
+        The returned copy of the bid has `filled` raised by the matches;
+        whatever it still wants rests in the book.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            key = (bid['crop_type'], bid['mandi_id'], bid['quality_grade'])
+            book = self._book(key)
+            bid = dict(bid)
+            tokens = []
+            while bid['filled'] < bid['lots']:
+                best = self._best_ask(book)
+                if best is None or best[0] > bid['price_per_kg']:
+                    break
+                heapq.heappop(book.asks)
+                del self._asks[best[1]['token_id']]
+                tokens.append(best[1])
+                bid['filled'] += 1
+            if bid['filled'] < bid['lots']:
+                self._rest_bid(bid)
+            return tokens, bid
+
+    def open_bid(self, bid_id: str) -> Optional[Dict]:
+        """A bid still taking part in matching, or None"""
+        with self._lock:
+            self._ensure_loaded()
+            bid = self._bids.get(bid_id)
+            return dict(bid) if bid is not None else None
+
+    def cancel_bid(self, bid_id: str):
+        """Stop matching a bid; its heap entry is dropped lazily"""
+        with self._lock:
+            self._ensure_loaded()
+            self._bids.pop(bid_id, None)
+
+    def depth(self, key: tuple) -> Dict:
+        """Open bid lots per price level and resting tokens per reserve level of one book"""
+        with self._lock:
+            self._ensure_loaded()
+            book = self._books.get(key)
+            bids: Dict[float, int] = {}
+            asks: Dict[float, int] = {}
+            if book is not None:
+                for _, _, bid_id in book.bids:
+                    bid = self._bids.get(bid_id)
+                    if bid is not None:
+                        bids[bid['price_per_kg']] = bids.get(bid['price_per_kg'], 0) + bid['lots'] - bid['filled']
+                for reserve, _, token_id in book.asks:
+                    token = repository.get_token(token_id)
+                    if token_id in self._asks and token is not None and token['status'] == "LISTED":
+                        asks[reserve] = asks.get(reserve, 0) + 1
+            return {
+                "bids": [{"price_per_kg": p, "lots": n} for p, n in sorted(bids.items(), reverse=True)],
+                "asks": [{"reserve_price_per_kg": p, "tokens": n} for p, n in sorted(asks.items())]
+            }
+
+
+# Shared instance used by the service layer
+matching_engine = MatchingEngine()
@@ -0,0 +1,257 @@
+import hashlib
+import threading
+from array import array
+from typing import List, Dict, Optional
+from utils import scan_audit_log
+
+# RFC 6962 domain separation prefixes
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+EMPTY_ROOT = hashlib.sha256(b"").digest()
+
+
+def leaf_hash(data: bytes) -> bytes:
+    """Hash of a leaf"""
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    """Hash of an interior node"""
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _split(n: int) -> int:
+    """Largest power of two strictly smaller than n"""
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+class MerkleTree:
+    """Append-only Merkle tree following RFC 6962
+
+    Hashes of every complete, aligned subtree are kept per level, so an
+    append touches O(log n) nodes and the root of any prefix of the tree,
+    inclusion proofs and consistency proofs are all computed from stored
+    nodes in O(log n) hashes.
+    """
+
+    def __init__(self):
+        self._levels: List[List[bytes]] = [[]]
+
+    @property
+    def size(self) -> int:
+        return len(self._levels[0])
+
+    def append(self, data: bytes) -> int:
+        """Add a leaf and return its index"""
+        node = leaf_hash(data)
+        self._levels[0].append(node)
+        level = 0
+        # Fold completed pairs upwards
+        while len(self._levels[level]) % 2 == 0:
+            pair = self._levels[level][-2:]
+            if len(self._levels) == level + 1:
+                self._levels.append([])
+            self._levels[level + 1].append(node_hash(pair[0], pair[1]))
+            level += 1
+        return self.size - 1
+
+    def leaf(self, index: int) -> bytes:
+        return self._levels[0][index]
+
+    def _subtree(self, start: int, end: int) -> bytes:
+        """MTH of leaves[start:end]"""
+        n = end - start
+        if n == 0:
+            return EMPTY_ROOT
+        if n & (n - 1) == 0 and start % n == 0:
+            level = n.bit_length() - 1
+            return self._levels[level][start >> level]
+        k = _split(n)
+        return node_hash(self._subtree(start, start + k), self._subtree(start + k, end))
+
+    def root(self, size: Optional[int] = None) -> bytes:
+        """Root hash of the first `size` leaves (default: whole tree)"""
+        size = self.size if size is None else size
+        self._check_size(size)
+        return self._subtree(0, size)
+
+    def inclusion_proof(self, index: int, size: Optional[int] = None) -> List[bytes]:
+        """Audit path proving leaf `index` is in the tree of `size` leaves"""
+        size = self.size if size is None else size
+        self._check_size(size)
+        if not 0 <= index < size:
+            raise ValueError(f"Leaf {index} is outside a tree of size {size}")
+        return self._path(index, 0, size)
+
+    def _path(self, m: int, start: int, end: int) -> List[bytes]:
+        n = end - start
+        if n == 1:
+            return []
+        k = _split(n)
+        if m < k:
+            return self._path(m, start, start + k) + [self._subtree(start + k, end)]
+        return self._path(m - k, start + k, end) + [self._subtree(start, start + k)]
+
+    def consistency_proof(self, first: int, second: Optional[int] = None) -> List[bytes]:
+        """Proof that the tree of `first` leaves is a prefix of `second`"""
+        second = self.size if second is None else second
+        self._check_size(second)
+        if not 0 <= first <= second:
+            raise ValueError(f"Invalid tree sizes {first} and {second}")
+        if first == 0 or first == second:
+            return []
+        return self._subproof(first, 0, second, True)
+
+    def _subproof(self, m: int, start: int, end: int, complete: bool) -> List[bytes]:
+        n = end - start
+        if m == n:
+            return [] if complete else [self._subtree(start, end)]
+        k = _split(n)
+        if m <= k:
+            return self._subproof(m, start, start + k, complete) + [self._subtree(start + k, end)]
+        return self._subproof(m - k, start + k, end, False) + [self._subtree(start, start + k)]
+
+    def _check_size(self, size: int):
+        if not 0 <= size <= self.size:
+            raise ValueError(f"Tree size {size} is outside 0..{self.size}")
+
+
+def verify_inclusion(leaf: bytes, index: int, size: int, proof: List[bytes], root: bytes) -> bool:
+    """Check an inclusion proof for a leaf hash (RFC 9162, 2.1.3.2)"""
+    if index >= size:
+        return False
+    fn, sn = index, size - 1
+    r = leaf
+    for p in proof:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = node_hash(p, r)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = node_hash(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+
+def verify_consistency(first: int, second: int, first_root: bytes, second_root: bytes,
+                       proof: List[bytes]) -> bool:
+    """Check a consistency proof between two tree sizes (RFC 9162, 2.1.4.2)"""
+    if first == second:
+        return first_root == second_root and not proof
+    if first == 0:
+        return not proof
+    if first > second or not proof:
+        return False
+    path = list(proof)
+    if first & (first - 1) == 0:
+        path.insert(0, first_root)
+    fn, sn = first - 1, second - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = path[0]
+    for c in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = node_hash(c, fr)
+            sr = node_hash(c, sr)
+            while not fn & 1 and fn != 0:
+                fn >>= 1
+                sn >>= 1
+        else:
+            sr = node_hash(sr, c)
+        fn >>= 1
+        sn >>= 1
+    return fr == first_root and sr == second_root and sn == 0
+
+
+class AuditMerkleIndex:
+    """Merkle tree over the audit log, kept in step with storage
+
+    Leaves are the entries' current_hash values in log order. The tree is
+    built from the log on first use and afterwards only reads entries
+    appended since the last sync.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tree = MerkleTree()
+        self._event_index: Dict[str, int] = {}
+        self._starts = array('q')  # scan position preceding each entry
+        self._position = None
+
+    def sync(self):
+        """Add any audit entries appended since the last sync"""
+        with self._lock:
+            for position, entry in scan_audit_log(self._position):
+                index = self._tree.append(bytes.fromhex(entry['current_hash']))
+                self._event_index[entry['event_id']] = index
+                self._starts.append(self._position or 0)
+                self._position = position
+
+    def root(self, size: Optional[int] = None) -> dict:
+        """Current (or historical) tree head"""
+        with self._lock:
+            self.sync()
+            size = self._tree.size if size is None else size
+            return {"tree_size": size, "root_hash": self._tree.root(size).hex()}
+
+    def index_of(self, event_id: str) -> Optional[int]:
+        with self._lock:
+            self.sync()
+            return self._event_index.get(event_id)
+
+    def inclusion_proof(self, event_id: str, size: Optional[int] = None) -> Optional[dict]:
+        """Inclusion proof for an event, or None if it is not in the log"""
+        with self._lock:
+            self.sync()
+            index = self._event_index.get(event_id)
+            size = self._tree.size if size is None else size
+            if index is None or index >= size:
+                return None
+            entry = next(scan_audit_log(self._starts[index]))[1]
+            return {
+                "event_id": event_id,
+                "entry": entry,
+                "leaf_index": index,
+                "tree_size": size,
+                "leaf_hash": self._tree.leaf(index).hex(),
+                "audit_path": [h.hex() for h in self._tree.inclusion_proof(index, size)],
+                "root_hash": self._tree.root(size).hex()
+            }
+
+    def inclusion_paths(self, indexes: List[int], size: Optional[int] = None) -> dict:
+        """Audit paths of several leaves against one tree head"""
+        with self._lock:
+            self.sync()
+            size = self._tree.size if size is None else size
+            return {
+                "tree_size": size,
+                "root_hash": self._tree.root(size).hex(),
+                "audit_paths": [
+                    [h.hex() for h in self._tree.inclusion_proof(index, size)] for index in indexes
+                ]
+            }
+
+    def consistency_proof(self, first: int, second: Optional[int] = None) -> dict:
+        """Consistency proof between two tree sizes"""
+        with self._lock:
+            self.sync()
+            second = self._tree.size if second is None else second
+            proof = self._tree.consistency_proof(first, second)
+            return {
+                "first": first,
+                "second": second,
+                "first_root": self._tree.root(first).hex(),
+                "second_root": self._tree.root(second).hex(),
+                "proof": [h.hex() for h in proof]
+            }
+
+
+# Shared instance used by the service layer
+audit_tree = AuditMerkleIndex()
@@ -0,0 +1,193 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Prometheus text exposition format; the response adds the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: Dict[str, str]) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum!r}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class _Operation:
+    """A storage call in progress; I/O noted inside it is added to it and its callers"""
+
+    __slots__ = ("name", "parent", "bytes_read", "bytes_written", "records")
+
+    def __init__(self, name: str, parent: Optional["_Operation"]):
+        self.name = name
+        self.parent = parent
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.records = 0
+
+
+# Innermost storage call running in the current context
+_current: contextvars.ContextVar[Optional[_Operation]] = contextvars.ContextVar("dhara_operation", default=None)
+# Per-operation [calls, seconds] of the request being served, if one is tracked
+_breakdown: contextvars.ContextVar[Optional[Dict[str, list]]] = contextvars.ContextVar("dhara_breakdown", default=None)
+
+
+class MetricsRegistry:
+    """Request and storage metrics of this process, rendered for Prometheus
+
+    Each server worker keeps its own registry, so with several workers every
+    scrape reports the worker that happened to answer it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._request_latency: Dict[tuple, Histogram] = {}
+        self._requests: Dict[tuple, int] = {}
+        self._request_errors: Dict[tuple, int] = {}
+        self._op_latency: Dict[str, Histogram] = {}
+        self._op_bytes_read: Dict[str, int] = {}
+        self._op_bytes_written: Dict[str, int] = {}
+        self._op_records: Dict[str, int] = {}
+
+    def record_request(self, method: str, route: str, status: int, seconds: float):
+        """Count one served request"""
+        with self._lock:
+            key = (method, route)
+            self._request_latency.setdefault(key, Histogram()).observe(seconds)
+            self._requests[key + (str(status),)] = self._requests.get(key + (str(status),), 0) + 1
+            if status >= 500:
+                self._request_errors[key] = self._request_errors.get(key, 0) + 1
+
+    def record_operation(self, name: str, seconds: float, bytes_read: int = 0,
+                         bytes_written: int = 0, records: int = 0):
+        """Count one storage call"""
+        with self._lock:
+            self._op_latency.setdefault(name, Histogram()).observe(seconds)
+            self._op_bytes_read[name] = self._op_bytes_read.get(name, 0) + bytes_read
+            self._op_bytes_written[name] = self._op_bytes_written.get(name, 0) + bytes_written
+            self._op_records[name] = self._op_records.get(name, 0) + records
+
+    def render(self) -> str:
+        """Everything recorded so far in the Prometheus text format"""
+        out = []
+
+        def family(name: str, kind: str, help_text: str):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("dhara_http_request_duration_seconds", "histogram", "Request latency by route")
+            for (method, route), histogram in sorted(self._request_latency.items()):
+                out += histogram.lines("dhara_http_request_duration_seconds", {"method": method, "route": route})
+            family("dhara_http_requests_total", "counter", "Requests served by route and status")
+            for (method, route, status), count in sorted(self._requests.items()):
+                out.append(f"dhara_http_requests_total{_labels({'method': method, 'route': route, 'status': status})} {count}")
+            family("dhara_http_request_errors_total", "counter", "Requests that ended in a server error")
+            for (method, route), count in sorted(self._request_errors.items()):
+                out.append(f"dhara_http_request_errors_total{_labels({'method': method, 'route': route})} {count}")
+
+            family("dhara_storage_operation_duration_seconds", "histogram", "Storage call latency by operation")
+            for name, histogram in sorted(self._op_latency.items()):
+                out += histogram.lines("dhara_storage_operation_duration_seconds", {"operation": name})
+            for metric, values, help_text in (
+                ("dhara_storage_bytes_read_total", self._op_bytes_read, "Bytes read by storage calls"),
+                ("dhara_storage_bytes_written_total", self._op_bytes_written, "Bytes written by storage calls"),
+                ("dhara_storage_records_total", self._op_records, "Records read or written by storage calls"),
+            ):
+                family(metric, "counter", help_text)
+                for name, value in sorted(values.items()):
+                    out.append(f"{metric}{_labels({'operation': name})} {value}")
+        return "\n".join(out) + "\n"
+
+
+@contextmanager
+def operation(name: str):
+    """Time a storage call, collecting the I/O the storage layer notes inside it"""
+    op = _Operation(name, _current.get())
+    token = _current.set(op)
+    started = time.perf_counter()
+    try:
+        yield op
+    finally:
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        metrics.record_operation(name, elapsed, op.bytes_read, op.bytes_written, op.records)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            entry = breakdown.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording every call of a function as a storage operation"""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with operation(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def note_io(bytes_read: int = 0, bytes_written: int = 0, records: int = 0):
+    """Attribute I/O to the storage call in progress and every call enclosing it"""
+    op = _current.get()
+    while op is not None:
+        op.bytes_read += bytes_read
+        op.bytes_written += bytes_written
+        op.records += records
+        op = op.parent
+
+
+def track_request() -> contextvars.Token:
+    """Start collecting a per-operation breakdown for the current request"""
+    return _breakdown.set({})
+
+
+def finish_request(token: contextvars.Token) -> Dict[str, list]:
+    """Stop collecting and return {operation: [calls, seconds]}"""
+    breakdown = _breakdown.get() or {}
+    _breakdown.reset(token)
+    return breakdown
+
+
+# Process-wide registry behind /metrics
+metrics = MetricsRegistry()
@@ -0,0 +1,72 @@
+"""One-shot migration of the JSON data files into the SQLite backend
+
+Usage:
+    python migrate.py [--data-dir DIR] [--db PATH] [--force]
+
+Reads each collection from its snapshot and JSON Lines log (or segment directory, for
+the audit log) when one exists, otherwise from the original JSON array, and writes everything into the database in a
+single transaction. Afterwards start the API with DHARA_STORAGE_BACKEND=sqlite.
+"""
+import argparse
+import os
+import sys
+from config import DATA_DIR, SQLITE_PATH
+from storage import COLLECTIONS, JsonlCollection, SegmentedLog, read_json_array
+from sqlite_store import SqliteStore
+
+
+def read_collection(data_dir: str, name: str) -> list:
+    """Read a collection without creating any files in data_dir"""
+    segments_dir = os.path.join(data_dir, name)
+    if os.path.isdir(segments_dir):
+        return SegmentedLog(segments_dir, COLLECTIONS[name]["key"]).load()
+    log_path = os.path.join(data_dir, f"{name}.jsonl")
+    if os.path.exists(log_path):
+        return JsonlCollection(log_path, COLLECTIONS[name]["key"]).load()
+    return read_json_array(os.path.join(data_dir, f"{name}.json"))
+
+
+def migrate(data_dir: str, db_path: str, force: bool = False) -> dict:
+    """Copy every collection and the price table into SQLite"""
+    target = SqliteStore(db_path)
+    target.ensure()
+
+    existing = sum(target.count(name) for name in COLLECTIONS)
+    if existing and not force:
+        raise RuntimeError(f"{db_path} already holds {existing} records; use --force to replace them")
+
+    counts = {}
+    conn = target._conn()
+    with target.transaction():
+        for name in COLLECTIONS:
+            conn.execute(f"DELETE FROM {name}")
+            records = read_collection(data_dir, name)
+            target.append_many(name, records)
+            counts[name] = len(records)
+        conn.execute("DELETE FROM prices")
+        prices = read_json_array(os.path.join(data_dir, "prices.json"))
+        target.put_prices(prices)
+        counts["prices"] = len(prices)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate data/*.json into SQLite")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory holding the JSON data files")
+    parser.add_argument("--db", default=SQLITE_PATH, help="SQLite database to create or fill")
+    parser.add_argument("--force", action="store_true", help="replace records already in the database")
+    args = parser.parse_args()
+
+    try:
+        counts = migrate(args.data_dir, args.db, args.force)
+    except RuntimeError as e:
+        print(f"Migration aborted: {e}")
+        sys.exit(1)
+
+    for name, count in counts.items():
+        print(f"{name}: {count} records")
+    print(f"Migrated into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
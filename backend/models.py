@@ -1,70 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Literal
-import hashlib
-import json
-
-class CropAsset(BaseModel):
-    crop_id: str
-    crop_type: str  # wheat, rice, cotton
-    quantity: float  # in kg
-    quality_grade: Literal["A", "B", "C"]
-    mandi_id: str
-    farmer_id: str
-    timestamp: datetime
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-
-class CropToken(BaseModel):
-    token_id: str
-    linked_crop_id: str
-    owner_id: str
-    status: Literal["CREATED", "LISTED", "SOLD", "SETTLED"]
-    audit_hash: str
-    created_at: datetime
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-
-class SettlementRecord(BaseModel):
-    settlement_id: str
-    token_id: str
-    seller_id: str
-    buyer_id: str
-    price_per_kg: float
-    quantity: float
-    total_amount: float
-    settlement_time: datetime
-    settlement_status: Literal["PENDING", "COMPLETED", "FAILED"]
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-
-class AuditLogEntry(BaseModel):
-    event_id: str
-    event_type: str
-    actor: str
-    timestamp: datetime
-    data: dict
-    previous_hash: str
-    current_hash: str
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-    
-    def calculate_hash(event_type: str, actor: str, timestamp: datetime, data: dict, previous_hash: str) -> str:
-        """Calculate SHA-256 hash for audit trail"""
-        content = f"{event_type}|{actor}|{timestamp.isoformat()}|{json.dumps(data, sort_keys=True)}|{previous_hash}"
-        return hashlib.sha256(content.encode()).hexdigest()
+from typing import Optional, Literal, List
 
 class PriceOracle(BaseModel):
     crop_type: str
@@ -86,11 +22,35 @@ class CropRegistrationRequest(BaseModel):
     mandi_id: str
     farmer_id: str
 
+class CropBatchRegistrationRequest(BaseModel):
+    # Items are validated individually so one bad entry doesn't reject the batch
+    crops: List[dict]
+
 class TokenListingRequest(BaseModel):
     token_id: str
     seller_id: str
+    reserve_price_per_kg: Optional[float] = Field(None, gt=0)
 
 class TradeAcceptanceRequest(BaseModel):
     token_id: str
 
     buyer_id: str
+
+class BidRequest(BaseModel):
+    buyer_id: str
+    crop_type: str
+    mandi_id: str
+    quality_grade: Literal["A", "B", "C"]
+    price_per_kg: float = Field(gt=0)
+    lots: int = Field(1, ge=1)
+
+class BidCancelRequest(BaseModel):
+    bid_id: str
+    buyer_id: str
+
+class TradeBatchRequest(BaseModel):
+    # Items are validated individually so one bad entry doesn't reject the batch
+    trades: List[dict]
+
+class PriceTickBatchRequest(BaseModel):
+    ticks: List[PriceOracle]
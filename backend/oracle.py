@@ -0,0 +1,114 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Any
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class PriceOracleCache:
+    """Price table indexed by (crop_type, mandi_id), reloaded only on change
+
+    The table lives in memory. At most once every `ttl` seconds the cache
+    asks storage for a cheap version token (file mtime/size or a database
+    counter) and reloads only if it changed. Entries whose timestamp is more
+    than `max_age` seconds old are flagged as stale. Every accepted tick,
+    not only the latest per key, is handed to `recorder` if one is given.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict]], version: Callable[[], Any],
+                 saver: Callable[[List[Dict]], None], ttl: float = 1.0,
+                 max_age: Optional[float] = None,
+                 recorder: Optional[Callable[[List[Dict]], None]] = None):
+        self._loader = loader
+        self._version = version
+        self._saver = saver
+        self._recorder = recorder
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._prices: Dict[tuple, Dict] = {}
+        self._loaded_version = None
+        self._checked_at = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.ttl:
+            return
+        version = self._version()
+        self._checked_at = now
+        if version != self._loaded_version or not self._prices:
+            self._prices = {(p['crop_type'], p['mandi_id']): p for p in self._loader()}
+            self._loaded_version = version
+
+    def invalidate(self):
+        """Force a version check on the next lookup"""
+        with self._lock:
+            self._checked_at = None
+
+    def get(self, crop_type: str, mandi_id: str) -> Optional[Dict]:
+        """Oracle entry for a crop at a mandi"""
+        with self._lock:
+            self._refresh()
+            return self._prices.get((crop_type, mandi_id))
+
+    def all(self) -> List[Dict]:
+        """Every oracle entry with its staleness flag"""
+        with self._lock:
+            self._refresh()
+            return [self.quote(p) for p in self._prices.values()]
+
+    def is_stale(self, entry: Dict) -> bool:
+        """Whether an entry is older than max_age"""
+        if self.max_age is None:
+            return False
+        timestamp = _parse_time(entry.get('timestamp'))
+        if timestamp is None:
+            return True
+        age = (datetime.now(timestamp.tzinfo) - timestamp).total_seconds()
+        return age > self.max_age
+
+    def quote(self, entry: Dict) -> Dict:
+        """Entry annotated with a stale flag"""
+        return {**entry, "stale": self.is_stale(entry)}
+
+    def push(self, ticks: List[Dict]) -> Dict:
+        """Store fresh price ticks, ignoring ones older than what is held"""
+        with self._lock:
+            self._checked_at = None
+            self._refresh()
+            latest: Dict[tuple, Dict] = {}
+            accepted = []
+            ignored = 0
+            for tick in ticks:
+                key = (tick['crop_type'], tick['mandi_id'])
+                current = latest.get(key) or self._prices.get(key)
+                if current and self._older(tick, current):
+                    ignored += 1
+                    continue
+                latest[key] = tick
+                accepted.append(tick)
+            if latest:
+                self._saver(list(latest.values()))
+                if self._recorder is not None:
+                    self._recorder(accepted)
+                self._prices.update(latest)
+                self._checked_at = None
+            return {"updated": len(latest), "ignored": ignored}
+
+    @staticmethod
+    def _older(tick: Dict, current: Dict) -> bool:
+        new_time = _parse_time(tick.get('timestamp'))
+        old_time = _parse_time(current.get('timestamp'))
+        try:
+            return bool(new_time and old_time and new_time < old_time)
+        except TypeError:
+            # Naive and timezone-aware timestamps cannot be compared
+            return False
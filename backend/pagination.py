@@ -0,0 +1,33 @@
+import base64
+import json
+from typing import Any, Iterable, Iterator, Dict
+from fastapi.responses import StreamingResponse
+
+# Page size used when a cursor is given without a limit, and the largest allowed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(position: Any) -> str:
+    """Wrap a storage position in an opaque cursor string"""
+    raw = json.dumps({"p": position}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    """Recover the storage position from a cursor; ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["p"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _ndjson_lines(records: Iterable[Dict]) -> Iterator[bytes]:
+    for record in records:
+        yield (json.dumps(record, default=str) + "\n").encode()
+
+
+def ndjson_response(records: Iterable[Dict]) -> StreamingResponse:
+    """Stream records as newline-delimited JSON, one record at a time"""
+    return StreamingResponse(_ndjson_lines(records), media_type="application/x-ndjson")
@@ -0,0 +1,95 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+from storage import RawJSON
+
+# Canonical form of hashed event data; same output as json.dumps(data, sort_keys=True)
+# without building an encoder for every entry
+_CANONICAL_JSON = json.JSONEncoder(sort_keys=True, check_circular=False)
+
+
+class _Record:
+    """Base of the internal records; fields are checked at the API boundary, not here"""
+
+    __slots__ = ()
+
+    def as_dict(self) -> Dict:
+        """The record as the plain dict storage, indexes and responses work with"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class CropAsset(_Record):
+    crop_id: str
+    crop_type: str  # wheat, rice, cotton
+    quantity: float  # in kg
+    quality_grade: str  # A, B or C
+    mandi_id: str
+    farmer_id: str
+    timestamp: datetime
+
+
+@dataclass(slots=True)
+class CropToken(_Record):
+    token_id: str
+    linked_crop_id: str
+    owner_id: str
+    status: str  # CREATED, LISTED, SOLD or SETTLED
+    audit_hash: str
+    created_at: datetime
+    listed_at: Optional[datetime] = None
+    # Lowest bid the order book may fill the token with
+    reserve_price_per_kg: Optional[float] = None
+
+
+@dataclass(slots=True)
+class SettlementRecord(_Record):
+    settlement_id: str
+    token_id: str
+    seller_id: str
+    buyer_id: str
+    price_per_kg: float
+    quantity: float
+    total_amount: float
+    settlement_time: datetime
+    settlement_status: str  # PENDING, COMPLETED or FAILED
+
+
+@dataclass(slots=True)
+class BidRecord(_Record):
+    bid_id: str
+    buyer_id: str
+    crop_type: str
+    mandi_id: str
+    quality_grade: str  # A, B or C
+    price_per_kg: float
+    lots: int  # tokens wanted
+    filled: int  # tokens bought so far
+    status: str  # OPEN, FILLED or CANCELLED
+    created_at: str  # stored form, which the order book compares with stored bids
+
+
+@dataclass(slots=True)
+class AuditLogEntry(_Record):
+    event_id: str
+    event_type: str
+    actor: str
+    timestamp: datetime
+    data: dict  # or its encode_data() form, for a new entry on its way to storage
+    previous_hash: str
+    current_hash: str
+
+    @staticmethod
+    def encode_data(data: dict) -> RawJSON:
+        """Canonical JSON of event data; the text that is hashed, stored as-is"""
+        return RawJSON(_CANONICAL_JSON.encode(data))
+
+    @staticmethod
+    def calculate_hash(event_type: str, actor: str, timestamp: datetime, data: dict, previous_hash: str) -> str:
+        """Calculate SHA-256 hash for audit trail; data may be given already encoded"""
+        if not isinstance(data, RawJSON):
+            data = _CANONICAL_JSON.encode(data)
+        content = f"{event_type}|{actor}|{timestamp.isoformat()}|{data}|{previous_hash}"
+        return hashlib.sha256(content.encode()).hexdigest()
@@ -0,0 +1,316 @@
+import threading
+from datetime import datetime
+from typing import List, Dict, Iterator, Optional, Tuple
+from utils import (
+    load_crops, load_tokens, load_settlements, save_crop, save_crops,
+    save_token, save_tokens, save_settlement, save_settlements,
+    append_token_update, append_token_updates, transaction, data_version, DATA_COLLECTIONS
+)
+
+
+# Token fields with a secondary index; the last three come from the linked crop
+TOKEN_INDEX_FIELDS = ("status", "owner_id", "crop_type", "mandi_id", "quality_grade")
+CROP_INDEX_FIELDS = ("crop_type", "mandi_id", "quality_grade")
+
+
+def _normalize(record: Dict) -> Dict:
+    """Return a copy of a record shaped the way storage hands it back"""
+    return {k: str(v) if isinstance(v, datetime) else v for k, v in record.items()}
+
+
+class Repository:
+    """In-memory indexed view of crops, tokens and settlements
+
+    Each collection is loaded from storage once and kept in a dict keyed by
+    its id, so lookups are O(1). Tokens also have secondary indexes
+    (value -> token ids) on status, owner and their crop's type, mandi and
+    grade. Writes update the indexes and go straight through to storage.
+    Records handed out are shared; treat them as read-only and change them
+    through the repository.
+
+    Writes enter a storage transaction before taking the repository lock,
+    the same order callers grouping several writes use. When another
+    process writes to the same storage the version token stops matching and
+    the next access reloads, so every server worker sees every write.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._generation = 0
+        self._crops: Dict[str, Dict] = {}
+        self._tokens: Dict[str, Dict] = {}
+        self._settlements: Dict[str, Dict] = {}
+        # Ids in insertion order, for positional paging
+        self._order: Dict[str, List[str]] = {"crops": [], "tokens": [], "settlements": []}
+        self._token_pos: Dict[str, int] = {}
+        self._token_index: Dict[str, Dict[str, set]] = {f: {} for f in TOKEN_INDEX_FIELDS}
+
+    def load(self):
+        """(Re)load every collection from storage"""
+        with self._lock:
+            # Taken first, so a write landing mid-load triggers another reload
+            version = data_version()
+            self._crops = {c['crop_id']: c for c in load_crops()}
+            self._settlements = {s['settlement_id']: s for s in load_settlements()}
+            self._order = {
+                "crops": list(self._crops),
+                "tokens": [],
+                "settlements": list(self._settlements)
+            }
+            self._tokens = {}
+            self._token_pos = {}
+            self._token_index = {f: {} for f in TOKEN_INDEX_FIELDS}
+            for token in load_tokens():
+                self._put_token(token)
+            self._version = version
+            self._generation += 1
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if not self._loaded or data_version() != self._version:
+            self.load()
+
+    def _written(self):
+        """Record our own write as seen; called inside the write transaction"""
+        self._version = data_version()
+
+    def generation(self) -> int:
+        """Counter bumped every time the collections are (re)loaded from storage"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._generation
+
+    def version(self, name: str):
+        """Token that changes whenever a collection is written, by any worker"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._version[DATA_COLLECTIONS.index(name)]
+
+    def _collection(self, name: str) -> Tuple[Dict[str, Dict], List[str]]:
+        records = {"crops": self._crops, "tokens": self._tokens, "settlements": self._settlements}[name]
+        return records, self._order[name]
+
+    def _index_values(self, token: Dict) -> Dict[str, str]:
+        crop = self._crops.get(token['linked_crop_id']) or {}
+        values = {"status": token.get('status'), "owner_id": token.get('owner_id')}
+        for field in CROP_INDEX_FIELDS:
+            values[field] = crop.get(field)
+        return values
+
+    def _put_token(self, token: Dict):
+        """Store a token and update order, positions and secondary indexes"""
+        token_id = token['token_id']
+        previous = self._tokens.get(token_id)
+        if previous is None:
+            self._token_pos[token_id] = len(self._order['tokens'])
+            self._order['tokens'].append(token_id)
+        else:
+            for field, value in self._index_values(previous).items():
+                ids = self._token_index[field].get(value)
+                if ids is not None:
+                    ids.discard(token_id)
+                    if not ids:
+                        del self._token_index[field][value]
+        self._tokens[token_id] = token
+        for field, value in self._index_values(token).items():
+            if value is not None:
+                self._token_index[field].setdefault(value, set()).add(token_id)
+
+    # === PAGING ===
+
+    def count(self, name: str) -> int:
+        """Number of records in a collection"""
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._order[name])
+
+    def page(self, name: str, start: int, limit: int) -> Tuple[List[Dict], Optional[int]]:
+        """Records [start, start + limit) and the start of the next page, if any"""
+        with self._lock:
+            self._ensure_loaded()
+            records, order = self._collection(name)
+            ids = order[start:start + limit]
+            end = start + len(ids)
+            return [records[i] for i in ids], end if end < len(order) else None
+
+    def get_many(self, name: str, ids: List[Optional[str]]) -> List[Optional[Dict]]:
+        """Records of a collection by id, None where missing, with one freshness check"""
+        with self._lock:
+            self._ensure_loaded()
+            records, _ = self._collection(name)
+            return [records.get(i) if i is not None else None for i in ids]
+
+    def iter_records(self, name: str) -> Iterator[Dict]:
+        """Yield the records present when iteration starts, without copying them"""
+        with self._lock:
+            self._ensure_loaded()
+            records, order = self._collection(name)
+            size = len(order)
+        # Ids are only ever appended, so the first `size` stay stable
+        for i in range(size):
+            yield records[order[i]]
+
+    # === CROPS ===
+
+    def get_crop(self, crop_id: str) -> Optional[Dict]:
+        """Find crop by ID"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._crops.get(crop_id)
+
+    def list_crops(self) -> List[Dict]:
+        """All crops in registration order"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._crops.values())
+
+    def add_crop(self, crop: Dict) -> Dict:
+        """Index and persist a new crop"""
+        crop = _normalize(crop)
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_crop(crop)
+            self._written()
+            if crop['crop_id'] not in self._crops:
+                self._order['crops'].append(crop['crop_id'])
+            self._crops[crop['crop_id']] = crop
+        return crop
+
+    def add_crops(self, crops: List[Dict]) -> List[Dict]:
+        """Index and persist several crops with one write"""
+        crops = [_normalize(c) for c in crops]
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_crops(crops)
+            self._written()
+            for crop in crops:
+                if crop['crop_id'] not in self._crops:
+                    self._order['crops'].append(crop['crop_id'])
+                self._crops[crop['crop_id']] = crop
+        return crops
+
+    # === TOKENS ===
+
+    def get_token(self, token_id: str) -> Optional[Dict]:
+        """Find token by ID"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._tokens.get(token_id)
+
+    def list_tokens(self) -> List[Dict]:
+        """All tokens in creation order"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._tokens.values())
+
+    def add_token(self, token: Dict) -> Dict:
+        """Index and persist a new token"""
+        token = _normalize(token)
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_token(token)
+            self._written()
+            self._put_token(token)
+        return token
+
+    def add_tokens(self, tokens: List[Dict]) -> List[Dict]:
+        """Index and persist several tokens with one write"""
+        tokens = [_normalize(t) for t in tokens]
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_tokens(tokens)
+            self._written()
+            for token in tokens:
+                self._put_token(token)
+        return tokens
+
+    def update_token(self, token_id: str, updates: Dict) -> bool:
+        """Apply updates to a token and persist them"""
+        updates = _normalize(updates)
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            token = self._tokens.get(token_id)
+            if token is None:
+                return False
+            append_token_update(token_id, updates)
+            self._written()
+            # Replace rather than mutate so records already handed out stay consistent
+            self._put_token({**token, **updates})
+            return True
+
+    def update_tokens(self, updates: List[tuple]) -> int:
+        """Apply (token_id, updates) pairs with one write; returns tokens updated"""
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            known = [(token_id, _normalize(u)) for token_id, u in updates if token_id in self._tokens]
+            append_token_updates(known)
+            self._written()
+            for token_id, u in known:
+                self._put_token({**self._tokens[token_id], **u})
+            return len(known)
+
+    def find_tokens(self, **filters) -> List[Dict]:
+        """Tokens matching every field=value filter, in creation order
+
+        Filters may use any of TOKEN_INDEX_FIELDS; None values are ignored.
+        Candidates come from the smallest matching index set and are checked
+        against the others, so no full scan happens when any filter is set.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            sets = []
+            for field, value in filters.items():
+                if value is None:
+                    continue
+                if field not in self._token_index:
+                    raise ValueError(f"Tokens are not indexed by {field}")
+                ids = self._token_index[field].get(value)
+                if not ids:
+                    return []
+                sets.append(ids)
+            if not sets:
+                return [self._tokens[i] for i in self._order['tokens']]
+            sets.sort(key=len)
+            smallest, rest = sets[0], sets[1:]
+            matched = [i for i in smallest if all(i in other for other in rest)]
+            matched.sort(key=self._token_pos.__getitem__)
+            return [self._tokens[i] for i in matched]
+
+    # === SETTLEMENTS ===
+
+    def list_settlements(self) -> List[Dict]:
+        """All settlements in execution order"""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._settlements.values())
+
+    def add_settlement(self, settlement: Dict) -> Dict:
+        """Index and persist a new settlement"""
+        settlement = _normalize(settlement)
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_settlement(settlement)
+            self._written()
+            if settlement['settlement_id'] not in self._settlements:
+                self._order['settlements'].append(settlement['settlement_id'])
+            self._settlements[settlement['settlement_id']] = settlement
+        return settlement
+
+    def add_settlements(self, settlements: List[Dict]) -> List[Dict]:
+        """Index and persist several settlements with one write"""
+        settlements = [_normalize(s) for s in settlements]
+        with transaction(), self._lock:
+            self._ensure_loaded()
+            save_settlements(settlements)
+            self._written()
+            for settlement in settlements:
+                if settlement['settlement_id'] not in self._settlements:
+                    self._order['settlements'].append(settlement['settlement_id'])
+                self._settlements[settlement['settlement_id']] = settlement
+        return settlements
+
+
+# Shared instance used by the service layer and the API
+repository = Repository()
@@ -1,14 +1,65 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from pydantic import ValidationError
 from models import (
-    CropAsset, CropToken, SettlementRecord, AuditLogEntry, PriceOracle,
-    CropRegistrationRequest, TokenListingRequest, TradeAcceptanceRequest
+    CropRegistrationRequest, TokenListingRequest, TradeAcceptanceRequest,
+    BidRequest, BidCancelRequest
 )
+from records import CropAsset, CropToken, SettlementRecord, AuditLogEntry, BidRecord
 from utils import (
-    generate_id, save_crop, save_token, save_settlement, save_audit_entry,
-    load_audit_log, get_price, find_token_by_id, find_crop_by_id, update_token
+    generate_id, save_audit_entries, load_audit_log,
+    load_last_audit_entry, get_price, transaction, scan_audit_log,
+    load_audit_checkpoint, save_audit_checkpoint, clear_audit_checkpoint,
+    scan_audit_between, audit_shards, load_bids, save_bid, update_bids
 )
+from repository import repository
+from merkle import audit_tree
+from audit_index import audit_index
+from event_stream import event_broker
+from stats import stats
+from matching import matching_engine
+from analytics import market_analytics
+from metrics import timed
+from config import VERIFY_WORKERS
 import json
 
+# Largest number of registrations accepted in one batch request
+MAX_BATCH_SIZE = 1000
+# Largest number of trades accepted in one bulk settlement request
+MAX_TRADE_BATCH_SIZE = 5000
+# Sort keys accepted by the marketplace query
+QUERY_SORT_FIELDS = ("created_at", "quantity", "estimated_value")
+# Audit entries per shard of a parallel verification (SQLite; the JSON log shards by segment)
+AUDIT_SHARD_SIZE = 10000
+
+# Worker processes of parallel verifications, started on first use and reused;
+# only one parallel verification runs at a time
+_verify_pool = None
+_verify_lock = threading.Lock()
+
+
+def _verify_workers() -> ProcessPoolExecutor:
+    global _verify_pool
+    if _verify_pool is None:
+        # Spawned workers open storage themselves instead of inheriting locks and handles
+        _verify_pool = ProcessPoolExecutor(VERIFY_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _verify_pool
+
+
+def close_verify_pool():
+    """Stop the parallel verification workers, if any were started"""
+    global _verify_pool
+    with _verify_lock:
+        if _verify_pool is not None:
+            _verify_pool.shutdown(cancel_futures=True)
+            _verify_pool = None
+
+
 class CropTokenizationService:
     """Core service for crop tokenization and settlement"""
     
@@ -16,10 +67,108 @@ class CropTokenizationService:
     def register_crop(request: CropRegistrationRequest) -> dict:
         """Register a new crop and create its token"""
         # Create crop asset
-        crop_id = generate_id(f"CROP_{request.crop_type.upper()}")
+        crop = CropTokenizationService._build_crop(request)
+        crop_id = crop.crop_id
+        crop_record = crop.as_dict()
+        
+        with transaction():
+            # Save crop
+            saved_crop = repository.add_crop(crop_record)
+            
+            # Create corresponding token
+            token = CropTokenizationService._create_token(crop)
+            
+            # Log to audit trail
+            CropTokenizationService._log_event(
+                event_type="CROP_REGISTERED",
+                actor=request.farmer_id,
+                data={
+                    "crop_id": crop_id,
+                    "crop_type": request.crop_type,
+                    "quantity": request.quantity,
+                    "quality_grade": request.quality_grade
+                }
+            )
+            stats.record_registrations([saved_crop], [token])
         
-        crop = CropAsset(
-            crop_id=crop_id,
+        return {
+            "success": True,
+            "crop": crop_record,
+            "token": token,
+            "message": "Crop registered and tokenized successfully"
+        }
+    
+    @staticmethod
+    def register_crops_batch(items: list) -> dict:
+        """Register many crops, persisting each collection with one write
+
+        Items are validated one by one; invalid items are reported and
+        skipped while the rest are registered together.
+        """
+        results = []
+        crops = []
+        tokens = []
+        events = []
+        for index, item in enumerate(items):
+            try:
+                request = CropRegistrationRequest.model_validate(item)
+            except ValidationError as e:
+                results.append({
+                    "index": index,
+                    "success": False,
+                    "message": "; ".join(
+                        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                        for err in e.errors()
+                    )
+                })
+                continue
+
+            crop = CropTokenizationService._build_crop(request)
+            token = CropTokenizationService._build_token(crop)
+            crops.append(crop.as_dict())
+            tokens.append(token.as_dict())
+            events.append(("TOKEN_CREATED", request.farmer_id, {
+                "token_id": token.token_id,
+                "crop_id": crop.crop_id
+            }))
+            events.append(("CROP_REGISTERED", request.farmer_id, {
+                "crop_id": crop.crop_id,
+                "crop_type": request.crop_type,
+                "quantity": request.quantity,
+                "quality_grade": request.quality_grade
+            }))
+            results.append({
+                "index": index,
+                "success": True,
+                "crop_id": crop.crop_id,
+                "token_id": token.token_id
+            })
+
+        if crops:
+            try:
+                with transaction():
+                    repository.add_crops(crops)
+                    repository.add_tokens(tokens)
+                    CropTokenizationService._log_events(events)
+                    stats.record_registrations(crops, tokens)
+            except Exception:
+                # Drop whatever was indexed before the failure
+                repository.load()
+                raise
+
+        return {
+            "success": True,
+            "registered": len(crops),
+            "failed": len(results) - len(crops),
+            "results": results,
+            "message": f"{len(crops)} of {len(results)} crops registered and tokenized"
+        }
+
+    @staticmethod
+    def _build_crop(request: CropRegistrationRequest) -> CropAsset:
+        """Create (but do not save) a crop asset for a registration"""
+        return CropAsset(
+            crop_id=generate_id(f"CROP_{request.crop_type.upper()}"),
             crop_type=request.crop_type,
             quantity=request.quantity,
             quality_grade=request.quality_grade,
@@ -27,43 +176,37 @@ class CropTokenizationService:
             farmer_id=request.farmer_id,
             timestamp=datetime.now()
         )
+
+    @staticmethod
+    def _create_token(crop: CropAsset) -> dict:
+        """Create a token for a crop asset"""
+        token = CropTokenizationService._build_token(crop).as_dict()
         
-        # Save crop
-        save_crop(crop.model_dump())
-        
-        # Create corresponding token
-        token = CropTokenizationService._create_token(crop)
+        repository.add_token(token)
         
-        # Log to audit trail
+        # Log token creation
         CropTokenizationService._log_event(
-            event_type="CROP_REGISTERED",
-            actor=request.farmer_id,
+            event_type="TOKEN_CREATED",
+            actor=crop.farmer_id,
             data={
-                "crop_id": crop_id,
-                "crop_type": request.crop_type,
-                "quantity": request.quantity,
-                "quality_grade": request.quality_grade
+                "token_id": token['token_id'],
+                "crop_id": crop.crop_id
             }
         )
         
-        return {
-            "success": True,
-            "crop": crop.model_dump(),
-            "token": token.model_dump(),
-            "message": "Crop registered and tokenized successfully"
-        }
-    
+        return token
+
     @staticmethod
-    def _create_token(crop: CropAsset) -> CropToken:
-        """Create a token for a crop asset"""
+    def _build_token(crop: CropAsset) -> CropToken:
+        """Create (but do not save) the token for a crop asset"""
         token_id = generate_id("TOKEN")
+        created_at = datetime.now()
         
         # Create audit hash
-        audit_data = f"{token_id}|{crop.crop_id}|{crop.farmer_id}|{datetime.now().isoformat()}"
         audit_hash = AuditLogEntry.calculate_hash(
             "TOKEN_CREATED",
             crop.farmer_id,
-            datetime.now(),
+            created_at,
             {"crop_id": crop.crop_id},
             "0" * 64  # Genesis hash
         )
@@ -74,19 +217,7 @@ class CropTokenizationService:
             owner_id=crop.farmer_id,
             status="CREATED",
             audit_hash=audit_hash,
-            created_at=datetime.now()
-        )
-        
-        save_token(token.model_dump())
-        
-        # Log token creation
-        CropTokenizationService._log_event(
-            event_type="TOKEN_CREATED",
-            actor=crop.farmer_id,
-            data={
-                "token_id": token_id,
-                "crop_id": crop.crop_id
-            }
+            created_at=created_at
         )
         
         return token
@@ -94,111 +225,486 @@ class CropTokenizationService:
     @staticmethod
     def list_token(request: TokenListingRequest) -> dict:
         """List a token for sale"""
-        token = find_token_by_id(request.token_id)
-        
-        if not token:
-            return {"success": False, "message": "Token not found"}
-        
-        if token['owner_id'] != request.seller_id:
-            return {"success": False, "message": "Unauthorized: You don't own this token"}
-        
-        if token['status'] != "CREATED":
-            return {"success": False, "message": f"Token cannot be listed. Current status: {token['status']}"}
-        
-        # Update token status
-        update_token(request.token_id, {"status": "LISTED"})
-        
-        # Log listing
-        CropTokenizationService._log_event(
-            event_type="TOKEN_LISTED",
-            actor=request.seller_id,
-            data={"token_id": request.token_id}
-        )
-        
+        # Check and update under one transaction so concurrent requests cannot both pass
+        with transaction():
+            token = repository.get_token(request.token_id)
+            
+            if not token:
+                return {"success": False, "message": "Token not found"}
+            
+            if token['owner_id'] != request.seller_id:
+                return {"success": False, "message": "Unauthorized: You don't own this token"}
+            
+            if token['status'] != "CREATED":
+                return {"success": False, "message": f"Token cannot be listed. Current status: {token['status']}"}
+            
+            # Update token status
+            updates = {"status": "LISTED", "listed_at": datetime.now()}
+            if request.reserve_price_per_kg is not None:
+                updates["reserve_price_per_kg"] = request.reserve_price_per_kg
+            repository.update_token(request.token_id, updates)
+            
+            # Log listing
+            CropTokenizationService._log_event(
+                event_type="TOKEN_LISTED",
+                actor=request.seller_id,
+                data={"token_id": request.token_id}
+            )
+            stats.record_status_change("CREATED", "LISTED")
+
+            # Fill the best standing bid the token reaches, if any
+            settlements = []
+            crop = repository.get_crop(token['linked_crop_id'])
+            if crop:
+                listed = repository.get_token(request.token_id)
+                try:
+                    bid = matching_engine.match_listing(listed, crop)
+                except Exception:
+                    matching_engine.invalidate()
+                    raise
+                if bid is not None:
+                    settlements = CropTokenizationService._settle_matches([(bid, listed, crop)])
+        
+        if settlements:
+            return {
+                "success": True,
+                "message": "Token listed and sold to a standing bid",
+                "token_id": request.token_id,
+                "settlement": settlements[0]
+            }
         return {
             "success": True,
             "message": "Token listed successfully",
-            "token_id": request.token_id
+            "token_id": request.token_id,
+            "settlement": None
         }
     
+    @staticmethod
+    def query_tokens(filters: dict, min_quantity: float | None = None,
+                     max_quantity: float | None = None, sort_by: str = "created_at",
+                     descending: bool = False, offset: int = 0, limit: int = 100) -> tuple:
+        """Tokens joined with their crops, filtered through the secondary indexes
+
+        Returns (rows, total, next_offset) where each row holds the token, its
+        crop and the crop's estimated value at the current oracle price.
+        """
+        if sort_by not in QUERY_SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {sort_by}")
+        prices = {}
+        rows = []
+        for token in repository.find_tokens(**filters):
+            crop = repository.get_crop(token['linked_crop_id'])
+            if crop is None:
+                continue
+            quantity = crop['quantity']
+            if min_quantity is not None and quantity < min_quantity:
+                continue
+            if max_quantity is not None and quantity > max_quantity:
+                continue
+            key = (crop['crop_type'], crop['mandi_id'])
+            if key not in prices:
+                prices[key] = get_price(*key)
+            rows.append({"token": token, "crop": crop, "estimated_value": quantity * prices[key]})
+
+        # Rows arrive in creation order, which is also the created_at order
+        if sort_by == "quantity":
+            rows.sort(key=lambda r: r['crop']['quantity'], reverse=descending)
+        elif sort_by == "estimated_value":
+            rows.sort(key=lambda r: r['estimated_value'], reverse=descending)
+        elif descending:
+            rows.reverse()
+
+        page = rows[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(rows) else None
+        return page, len(rows), next_offset
+
     @staticmethod
     def execute_trade(request: TradeAcceptanceRequest) -> dict:
         """Execute trade and settlement"""
-        token = find_token_by_id(request.token_id)
+        # Check and settle under one transaction so a token cannot be sold twice
+        with transaction():
+            token = repository.get_token(request.token_id)
+            error = CropTokenizationService._check_tradable(token)
+            if error:
+                return {"success": False, "message": error}
+            
+            # Get linked crop
+            crop = repository.get_crop(token['linked_crop_id'])
+            if not crop:
+                return {"success": False, "message": "Linked crop not found"}
+            
+            # Get price from oracle
+            price_per_kg = get_price(crop['crop_type'], crop['mandi_id'])
+            
+            # Create settlement record
+            settlement = CropTokenizationService._build_settlement(
+                request.token_id, request.buyer_id, token, crop, price_per_kg
+            )
+            settlement_record = settlement.as_dict()
+            
+            repository.add_settlement(settlement_record)
+            
+            # Update token ownership and status
+            repository.update_token(request.token_id, {
+                "owner_id": request.buyer_id,
+                "status": "SETTLED"
+            })
+            
+            # Log settlement
+            CropTokenizationService._log_event(
+                *CropTokenizationService._settlement_event(settlement)
+            )
+            stats.record_settlements([settlement_record])
         
+        return {
+            "success": True,
+            "message": "Trade executed and settled successfully",
+            "settlement": settlement_record,
+            "settlement_time_seconds": 0.5  # Simulated instant settlement
+        }
+
+    @staticmethod
+    def execute_trades_batch(items: list) -> dict:
+        """Settle many trades against one snapshot and commit them together
+
+        Every item is checked against the token state at the start of the
+        batch; a token may only be bought once per batch. Settlements, token
+        updates and audit events of the accepted trades are then persisted
+        with one write per collection.
+        """
+        results = []
+        settlements = []
+        token_updates = []
+        events = []
+        claimed = set()
+        prices = {}
+
+        with transaction():
+            for index, item in enumerate(items):
+                try:
+                    request = TradeAcceptanceRequest.model_validate(item)
+                except ValidationError as e:
+                    results.append({
+                        "index": index,
+                        "success": False,
+                        "message": "; ".join(
+                            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+                            for err in e.errors()
+                        )
+                    })
+                    continue
+
+                if request.token_id in claimed:
+                    results.append({
+                        "index": index,
+                        "success": False,
+                        "token_id": request.token_id,
+                        "message": "Token already settled earlier in this batch"
+                    })
+                    continue
+
+                token = repository.get_token(request.token_id)
+                error = CropTokenizationService._check_tradable(token)
+                crop = repository.get_crop(token['linked_crop_id']) if not error else None
+                if not error and not crop:
+                    error = "Linked crop not found"
+                if error:
+                    results.append({
+                        "index": index,
+                        "success": False,
+                        "token_id": request.token_id,
+                        "message": error
+                    })
+                    continue
+
+                price_key = (crop['crop_type'], crop['mandi_id'])
+                if price_key not in prices:
+                    prices[price_key] = get_price(*price_key)
+
+                settlement = CropTokenizationService._build_settlement(
+                    request.token_id, request.buyer_id, token, crop, prices[price_key]
+                )
+                claimed.add(request.token_id)
+                settlements.append(settlement.as_dict())
+                token_updates.append((request.token_id, {
+                    "owner_id": request.buyer_id,
+                    "status": "SETTLED"
+                }))
+                events.append(CropTokenizationService._settlement_event(settlement))
+                results.append({
+                    "index": index,
+                    "success": True,
+                    "token_id": request.token_id,
+                    "settlement_id": settlement.settlement_id,
+                    "total_amount": settlement.total_amount
+                })
+
+            if settlements:
+                try:
+                    repository.add_settlements(settlements)
+                    repository.update_tokens(token_updates)
+                    CropTokenizationService._log_events(events)
+                    stats.record_settlements(settlements)
+                except Exception:
+                    # Drop whatever was indexed before the failure
+                    repository.load()
+                    raise
+
+        return {
+            "success": True,
+            "settled": len(settlements),
+            "failed": len(results) - len(settlements),
+            "total_amount": sum(s['total_amount'] for s in settlements),
+            "results": results,
+            "message": f"{len(settlements)} of {len(results)} trades settled"
+        }
+
+    @staticmethod
+    def place_bid(request: BidRequest) -> dict:
+        """Place a standing bid, first filling it from the listed tokens it reaches"""
+        bid = BidRecord(
+            bid_id=generate_id("BID"),
+            buyer_id=request.buyer_id,
+            crop_type=request.crop_type,
+            mandi_id=request.mandi_id,
+            quality_grade=request.quality_grade,
+            price_per_kg=request.price_per_kg,
+            lots=request.lots,
+            filled=0,
+            status="OPEN",
+            created_at=str(datetime.now())
+        ).as_dict()
+
+        with transaction():
+            try:
+                tokens, bid = matching_engine.match_bid(bid)
+            except Exception:
+                matching_engine.invalidate()
+                raise
+            if bid['filled'] >= bid['lots']:
+                bid['status'] = "FILLED"
+            matches = [(bid, token, repository.get_crop(token['linked_crop_id'])) for token in tokens]
+            settlements = CropTokenizationService._settle_matches(matches, placed=bid)
+
+        return {
+            "success": True,
+            "message": f"Bid placed; {len(settlements)} of {bid['lots']} lots filled",
+            "bid": bid,
+            "settlements": settlements
+        }
+
+    @staticmethod
+    def cancel_bid(request: BidCancelRequest) -> dict:
+        """Withdraw what is left of an open bid"""
+        with transaction():
+            bid = matching_engine.open_bid(request.bid_id)
+            if not bid:
+                return {"success": False, "message": "Bid not found or no longer open"}
+            if bid['buyer_id'] != request.buyer_id:
+                return {"success": False, "message": "Unauthorized: You didn't place this bid"}
+            try:
+                update_bids([(request.bid_id, {"status": "CANCELLED"})])
+                CropTokenizationService._log_event(
+                    event_type="BID_CANCELLED",
+                    actor=request.buyer_id,
+                    data={"bid_id": request.bid_id, "unfilled_lots": bid['lots'] - bid['filled']}
+                )
+                matching_engine.cancel_bid(request.bid_id)
+                matching_engine.written()
+            except Exception:
+                matching_engine.invalidate()
+                raise
+
+        return {
+            "success": True,
+            "message": "Bid cancelled",
+            "bid": {**bid, "status": "CANCELLED"}
+        }
+
+    @staticmethod
+    def get_bids(buyer_id: str | None = None, status: str | None = None) -> list:
+        """Bids in placement order, optionally for one buyer or status"""
+        return [
+            bid for bid in load_bids()
+            if (buyer_id is None or bid['buyer_id'] == buyer_id)
+            and (status is None or bid['status'] == status)
+        ]
+
+    @staticmethod
+    def get_order_book(crop_type: str, mandi_id: str, quality_grade: str) -> dict:
+        """Depth of the book one crop type, mandi and grade trade in"""
+        return {
+            "success": True,
+            "crop_type": crop_type,
+            "mandi_id": mandi_id,
+            "quality_grade": quality_grade,
+            **matching_engine.depth((crop_type, mandi_id, quality_grade))
+        }
+
+    @staticmethod
+    def get_price_history(crop_type: str, mandi_id: str, interval: int = 86400,
+                          since: datetime | None = None, until: datetime | None = None,
+                          source: str = "trades") -> dict:
+        """Candles of one crop at one mandi: OHLC, traded volume and VWAP per interval"""
+        candles = market_analytics.ohlc(crop_type, mandi_id, interval, since, until, source)
+        return {
+            "success": True,
+            "crop_type": crop_type,
+            "mandi_id": mandi_id,
+            "source": source,
+            "interval": interval,
+            "candles": candles,
+            "total": len(candles)
+        }
+
+    @staticmethod
+    def get_market_summary(crop_type: str, mandi_id: str, since: datetime | None = None,
+                           until: datetime | None = None, source: str = "trades") -> dict:
+        """OHLC, traded volume and VWAP of one crop at one mandi over a time range"""
+        return {
+            "success": True,
+            "crop_type": crop_type,
+            "mandi_id": mandi_id,
+            "source": source,
+            "summary": market_analytics.summary(crop_type, mandi_id, since, until, source)
+        }
+
+    @staticmethod
+    def get_markets() -> list:
+        """Every crop and mandi with recorded trades or oracle ticks"""
+        return market_analytics.markets()
+
+    @staticmethod
+    def _settle_matches(matches: list, placed: dict | None = None) -> list:
+        """Persist trades matched by the order book with one write per collection
+
+        `matches` holds (bid, token, crop) triples whose bids already count
+        the trades in `filled`. A newly placed bid is saved with them. Every
+        trade settles at the bid price and is audited as TRADE_SETTLED.
+        """
+        settlements = []
+        token_updates = []
+        bid_updates = {}
+        events = []
+        if placed is not None:
+            events.append(("BID_PLACED", placed['buyer_id'], {
+                "bid_id": placed['bid_id'],
+                "crop_type": placed['crop_type'],
+                "mandi_id": placed['mandi_id'],
+                "quality_grade": placed['quality_grade'],
+                "price_per_kg": placed['price_per_kg'],
+                "lots": placed['lots']
+            }))
+
+        for bid, token, crop in matches:
+            settlement = CropTokenizationService._build_settlement(
+                token['token_id'], bid['buyer_id'], token, crop, bid['price_per_kg']
+            )
+            settlements.append(settlement.as_dict())
+            token_updates.append((token['token_id'], {
+                "owner_id": bid['buyer_id'],
+                "status": "SETTLED"
+            }))
+            event_type, actor, data = CropTokenizationService._settlement_event(settlement)
+            events.append((event_type, actor, {**data, "bid_id": bid['bid_id']}))
+            if placed is None or bid['bid_id'] != placed['bid_id']:
+                bid_updates[bid['bid_id']] = {
+                    "filled": bid['filled'],
+                    "status": "FILLED" if bid['filled'] >= bid['lots'] else "OPEN"
+                }
+
+        try:
+            if placed is not None:
+                save_bid(placed)
+            if bid_updates:
+                update_bids(list(bid_updates.items()))
+            if settlements:
+                repository.add_settlements(settlements)
+                repository.update_tokens(token_updates)
+            CropTokenizationService._log_events(events)
+            if settlements:
+                stats.record_settlements(settlements)
+            matching_engine.written()
+        except Exception:
+            # Drop whatever was indexed or matched before the failure
+            repository.load()
+            matching_engine.invalidate()
+            raise
+        return settlements
+
+    @staticmethod
+    def _check_tradable(token: dict | None) -> str | None:
+        """Reason a token cannot be traded, or None"""
         if not token:
-            return {"success": False, "message": "Token not found"}
-        
+            return "Token not found"
         if token['status'] != "LISTED":
-            return {"success": False, "message": f"Token not available for trade. Status: {token['status']}"}
-        
-        # Get linked crop
-        crop = find_crop_by_id(token['linked_crop_id'])
-        if not crop:
-            return {"success": False, "message": "Linked crop not found"}
-        
-        # Get price from oracle
-        price_per_kg = get_price(crop['crop_type'], crop['mandi_id'])
-        total_amount = price_per_kg * crop['quantity']
-        
-        # Create settlement record
-        settlement_id = generate_id("SETTLEMENT")
-        settlement = SettlementRecord(
-            settlement_id=settlement_id,
-            token_id=request.token_id,
+            return f"Token not available for trade. Status: {token['status']}"
+        return None
+
+    @staticmethod
+    def _build_settlement(token_id: str, buyer_id: str, token: dict, crop: dict,
+                          price_per_kg: float) -> SettlementRecord:
+        """Create (but do not save) the settlement of a token sold to a buyer"""
+        return SettlementRecord(
+            settlement_id=generate_id("SETTLEMENT"),
+            token_id=token_id,
             seller_id=token['owner_id'],
-            buyer_id=request.buyer_id,
+            buyer_id=buyer_id,
             price_per_kg=price_per_kg,
             quantity=crop['quantity'],
-            total_amount=total_amount,
+            total_amount=price_per_kg * crop['quantity'],
             settlement_time=datetime.now(),
             settlement_status="COMPLETED"
         )
-        
-        save_settlement(settlement.model_dump())
-        
-        # Update token ownership and status
-        update_token(request.token_id, {
-            "owner_id": request.buyer_id,
-            "status": "SETTLED"
+
+    @staticmethod
+    def _settlement_event(settlement: SettlementRecord) -> tuple:
+        """Audit event (event_type, actor, data) for a settlement"""
+        return ("TRADE_SETTLED", settlement.buyer_id, {
+            "token_id": settlement.token_id,
+            "settlement_id": settlement.settlement_id,
+            "seller": settlement.seller_id,
+            "buyer": settlement.buyer_id,
+            "amount": settlement.total_amount
         })
-        
-        # Log settlement
-        CropTokenizationService._log_event(
-            event_type="TRADE_SETTLED",
-            actor=request.buyer_id,
-            data={
-                "token_id": request.token_id,
-                "settlement_id": settlement_id,
-                "seller": token['owner_id'],
-                "buyer": request.buyer_id,
-                "amount": total_amount
-            }
-        )
-        
-        return {
-            "success": True,
-            "message": "Trade executed and settled successfully",
-            "settlement": settlement.model_dump(),
-            "settlement_time_seconds": 0.5  # Simulated instant settlement
-        }
     
     @staticmethod
     def _log_event(event_type: str, actor: str, data: dict):
         """Add entry to audit log"""
-        audit_log = load_audit_log()
-        
-        # Get previous hash
-        previous_hash = audit_log[-1]['current_hash'] if audit_log else "0" * 64
-        
+        CropTokenizationService._log_events([(event_type, actor, data)])
+
+    @staticmethod
+    @timed("log_event")
+    def _log_events(events: list):
+        """Append (event_type, actor, data) events to the audit chain in one write"""
+        with transaction():
+            # Get previous hash; read under the write lock so workers never fork the chain
+            head = load_last_audit_entry()
+            previous_hash = head['current_hash'] if head else "0" * 64
+
+            entries = []
+            for event_type, actor, data in events:
+                entry = CropTokenizationService._build_event(event_type, actor, data, previous_hash)
+                entries.append(entry.as_dict())
+                previous_hash = entry.current_hash
+
+            save_audit_entries(entries)
+        # Live subscribers are fed from the log, so wake them once it holds the entries
+        event_broker.notify()
+
+    @staticmethod
+    def _build_event(event_type: str, actor: str, data: dict, previous_hash: str) -> AuditLogEntry:
+        """Create an audit entry chained to previous_hash"""
         event_id = generate_id("EVENT")
         timestamp = datetime.now()
+        # Encoded once: the same text is hashed and written to the log
+        data = AuditLogEntry.encode_data(data)
         
         current_hash = AuditLogEntry.calculate_hash(
             event_type, actor, timestamp, data, previous_hash
         )
         
-        entry = AuditLogEntry(
+        return AuditLogEntry(
             event_id=event_id,
             event_type=event_type,
             actor=actor,
@@ -207,35 +713,300 @@ class CropTokenizationService:
             previous_hash=previous_hash,
             current_hash=current_hash
         )
-        
-        save_audit_entry(entry.model_dump())
     
     @staticmethod
     def get_audit_trail() -> list:
         """Retrieve complete audit trail"""
         return load_audit_log()
+
+    @staticmethod
+    def get_audit_page(after=None, limit: int = 100) -> tuple:
+        """Up to `limit` entries after a scan position, plus the next position"""
+        page = []
+        last_position = None
+        for position, entry in scan_audit_log(after):
+            if len(page) == limit:
+                return page, last_position
+            page.append(entry)
+            last_position = position
+        return page, None
+
+    @staticmethod
+    def iter_audit_trail():
+        """Yield audit entries straight from storage"""
+        for _, entry in scan_audit_log():
+            yield entry
+
+    @staticmethod
+    def iter_audit_range(since: datetime | None = None, until: datetime | None = None):
+        """Yield audit entries logged between two times (inclusive)"""
+        # Entries carry naive local timestamps
+        since, until = (
+            t.astimezone().replace(tzinfo=None) if t and t.tzinfo else t for t in (since, until)
+        )
+        return scan_audit_between(since, until)
     
     @staticmethod
-    def verify_audit_integrity() -> dict:
-        """Verify integrity of audit trail"""
-        log = load_audit_log()
-        
-        if not log:
+    def query_audit(filters: dict, since: datetime | None = None, until: datetime | None = None,
+                    after: int | None = None, limit: int = 100, proofs: bool = False) -> tuple:
+        """Audit entries matching every filter, found through the audit indexes
+
+        Returns (body, next_after). Each result carries the entry's index in
+        the log, which is also its Merkle leaf index, and with `proofs` its
+        audit path against the tree head included in the body.
+        """
+        indexes, next_after = audit_index.search(filters, since, until, after, limit)
+        return CropTokenizationService._audit_results(indexes, proofs), next_after
+
+    @staticmethod
+    def get_token_history(token_id: str, proofs: bool = False) -> dict:
+        """Every audit event about a token and the crop behind it, in log order"""
+        token = repository.get_token(token_id)
+        if not token:
+            return {"success": False, "message": "Token not found"}
+        indexes = audit_index.history([("token_id", token_id), ("crop_id", token['linked_crop_id'])])
+        return {
+            "success": True,
+            "token": token,
+            **CropTokenizationService._audit_results(indexes, proofs)
+        }
+
+    @staticmethod
+    def _audit_results(indexes: list, proofs: bool) -> dict:
+        """Entries at the given log indexes, with their audit paths if asked for"""
+        results = [
+            {"index": index, "entry": entry}
+            for index, entry in zip(indexes, audit_index.entries(indexes))
+        ]
+        if not proofs:
+            return {"results": results}
+        head = audit_tree.inclusion_paths(indexes)
+        for result, path in zip(results, head.pop("audit_paths")):
+            result["audit_path"] = path
+        return {"results": results, **head}
+
+    @staticmethod
+    def get_audit_root() -> dict:
+        """Publish the Merkle root over all audit entries"""
+        return {"success": True, **audit_tree.root()}
+
+    @staticmethod
+    def get_inclusion_proof(event_id: str, tree_size: int | None = None) -> dict:
+        """Prove a single audit event is part of the log"""
+        proof = audit_tree.inclusion_proof(event_id, tree_size)
+        if proof is None:
+            return {"success": False, "message": "Event not found in audit tree"}
+        return {"success": True, **proof}
+
+    @staticmethod
+    def get_consistency_proof(first: int, second: int | None = None) -> dict:
+        """Prove an earlier audit tree is a prefix of a later one"""
+        return {"success": True, **audit_tree.consistency_proof(first, second)}
+
+    @staticmethod
+    def verify_audit_integrity(full: bool = False) -> dict:
+        """Verify integrity of audit trail
+
+        Every entry's hash is recomputed and its link to the previous entry
+        checked. Entries already covered by the saved checkpoint are skipped
+        unless full verification is requested.
+        """
+        checkpoint = None if full else load_audit_checkpoint()
+        if checkpoint:
+            result = CropTokenizationService._verify_audit_from(checkpoint)
+            if result is not None:
+                return result
+        # No checkpoint, or it no longer matches the log
+        return CropTokenizationService._verify_audit_from(None)
+
+    @staticmethod
+    def _verify_audit_from(checkpoint: dict | None) -> dict | None:
+        """Verify entries after a checkpoint; None if the checkpoint is stale"""
+        resume_after = checkpoint['after'] if checkpoint else None
+        entries = scan_audit_log(resume_after)
+        index = -1
+        previous_hash = "0" * 64
+        position = resume_after
+        last_entry = None
+
+        if checkpoint:
+            # Re-read the checkpointed entry to make sure it is still there
+            anchor = next(entries, None)
+            if (anchor is None or anchor[1].get('event_id') != checkpoint['event_id']
+                    or anchor[1].get('current_hash') != checkpoint['hash']):
+                return None
+            index = checkpoint['index']
+            if CropTokenizationService._entry_hash(anchor[1]) != checkpoint['hash']:
+                return CropTokenizationService._tampered(index, anchor[1], "Entry content does not match its hash")
+            previous_hash = checkpoint['hash']
+            position, last_entry = anchor
+
+        verified = 0
+        for next_position, entry in entries:
+            index += 1
+            if entry.get('previous_hash') != previous_hash:
+                return CropTokenizationService._tampered(index, entry, "Broken hash link")
+            if CropTokenizationService._entry_hash(entry) != entry.get('current_hash'):
+                return CropTokenizationService._tampered(index, entry, "Entry content does not match its hash")
+            previous_hash = entry['current_hash']
+            resume_after, position = position, next_position
+            last_entry = entry
+            verified += 1
+
+        if last_entry is None:
             return {"valid": True, "message": "Audit log is empty"}
-        
-        for i in range(1, len(log)):
-            expected_prev_hash = log[i-1]['current_hash']
-            actual_prev_hash = log[i]['previous_hash']
-            
-            if expected_prev_hash != actual_prev_hash:
-                return {
-                    "valid": False,
-                    "message": f"Audit trail tampered at entry {i}",
-                    "entry_id": log[i]['event_id']
-                }
-        
+
+        if verified:
+            save_audit_checkpoint({
+                "index": index,
+                "event_id": last_entry['event_id'],
+                "hash": previous_hash,
+                "after": resume_after,
+                "verified_at": datetime.now().isoformat()
+            })
+
+        return {
+            "valid": True,
+            "message": "Audit trail integrity verified",
+            "total_entries": index + 1,
+            "newly_verified": verified
+        }
+
+    @staticmethod
+    def verify_audit_parallel(workers: int | None = None, shard_size: int = AUDIT_SHARD_SIZE) -> dict:
+        """Re-verify the whole audit trail from scratch across a process pool
+
+        The log is split into shards that worker processes re-hash on their
+        own, each also checking the links inside its shard. The links
+        between shards are checked while merging, so the report names the
+        first broken entry exactly as a sequential verification would.
+        At most VERIFY_WORKERS processes are used, and a request made while
+        another parallel verification is running is turned away.
+        """
+        if not _verify_lock.acquire(blocking=False):
+            return {"success": False, "message": "A parallel audit verification is already running"}
+        try:
+            started = time.perf_counter()
+            shards = audit_shards(shard_size)
+            workers = max(1, min(workers or VERIFY_WORKERS, VERIFY_WORKERS, len(shards) or 1))
+            results = CropTokenizationService._verify_shards(shards, workers)
+        finally:
+            _verify_lock.release()
+
+        previous_hash = "0" * 64
+        last = None
+        for result in results:
+            if not result['count']:
+                continue
+            if result['first_previous_hash'] != previous_hash:
+                return CropTokenizationService._tampered(
+                    result['first_index'], {"event_id": result['first_event_id']}, "Broken hash link"
+                )
+            if result['error']:
+                index, event_id, reason = result['error']
+                return CropTokenizationService._tampered(index, {"event_id": event_id}, reason)
+            previous_hash = result['last_hash']
+            last = result
+
+        if last is None:
+            return {"valid": True, "message": "Audit log is empty"}
+
+        total = last['first_index'] + last['count']
+        save_audit_checkpoint({
+            "index": total - 1,
+            "event_id": last['last_event_id'],
+            "hash": previous_hash,
+            "after": last['last_after'],
+            "verified_at": datetime.now().isoformat()
+        })
         return {
             "valid": True,
             "message": "Audit trail integrity verified",
-            "total_entries": len(log)
-        }
\ No newline at end of file
+            "total_entries": total,
+            "newly_verified": total,
+            "shards": len(shards),
+            "workers": workers,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+
+    @staticmethod
+    def _verify_shards(shards: list, workers: int) -> list:
+        """Shard results in log order, keeping at most `workers` shards in flight"""
+        global _verify_pool
+        pool = _verify_workers()
+        results = []
+        pending = deque()
+        try:
+            for shard in shards:
+                if len(pending) == workers:
+                    results.append(pending.popleft().result())
+                pending.append(pool.submit(_verify_audit_shard, shard))
+            results.extend(future.result() for future in pending)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next verification
+            _verify_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        return results
+
+    @staticmethod
+    def _entry_hash(entry: dict) -> str | None:
+        """Recompute the hash of a stored audit entry"""
+        try:
+            timestamp = entry['timestamp']
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            return AuditLogEntry.calculate_hash(
+                entry['event_type'], entry['actor'], timestamp,
+                entry['data'], entry['previous_hash']
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _tampered(index: int, entry: dict, reason: str) -> dict:
+        """Report tampering and drop the checkpoint so nothing is skipped later"""
+        clear_audit_checkpoint()
+        return {
+            "valid": False,
+            "message": f"Audit trail tampered at entry {index}",
+            "entry_id": entry.get('event_id'),
+            "reason": reason
+        }
+
+
+def _verify_audit_shard(shard: dict) -> dict:
+    """Re-hash one shard of the audit log and check its internal links (worker process)"""
+    index = shard['first_index'] - 1
+    count = 0
+    previous_hash = None
+    first = None
+    last = None
+    position = last_after = shard['after']
+    error = None
+    for next_position, entry in scan_audit_log(shard['after']):
+        if shard['count'] is not None and count == shard['count']:
+            break
+        index += 1
+        count += 1
+        if first is None:
+            first = entry
+        elif entry.get('previous_hash') != previous_hash:
+            error = (index, entry.get('event_id'), "Broken hash link")
+            break
+        if CropTokenizationService._entry_hash(entry) != entry.get('current_hash'):
+            error = (index, entry.get('event_id'), "Entry content does not match its hash")
+            break
+        previous_hash = entry['current_hash']
+        last_after, position = position, next_position
+        last = entry
+    return {
+        "first_index": shard['first_index'],
+        "count": count,
+        "first_event_id": first.get('event_id') if first else None,
+        "first_previous_hash": first.get('previous_hash') if first else None,
+        "last_event_id": last.get('event_id') if last else None,
+        "last_hash": previous_hash,
+        "last_after": last_after,
+        "error": error
+    }
@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Iterable, Iterator, Optional
+from storage import COLLECTIONS, read_json_array, encode_record
+from metrics import note_io
+
+# Rows fetched per query while scanning a table
+SCAN_CHUNK = 500
+
+
+def _dumps(record: Dict) -> str:
+    return encode_record(record)
+
+
+def _loads(data: str) -> Dict:
+    note_io(bytes_read=len(data), records=1)
+    return json.loads(data)
+
+
+class SqliteStore:
+    """Storage backend keeping every collection in one SQLite database
+
+    Each collection is a table holding the full record as JSON next to
+    indexed copies of its key and lookup fields. The database runs in WAL
+    mode so readers never block the writer, and BEGIN IMMEDIATE serializes
+    writers across threads and processes. Connections are per thread.
+    """
+
+    def __init__(self, db_path: str, prices_file: Optional[str] = None):
+        self.db_path = db_path
+        self.prices_file = prices_file
+        self._local = threading.local()
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _db(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.ensure()
+        return self._conn()
+
+    def ensure(self):
+        """Create tables and indexes, seeding prices on first use"""
+        with self._init_lock:
+            if self._ready:
+                return
+            conn = self._conn()
+            for name, spec in COLLECTIONS.items():
+                fields = [spec["key"]] + spec["indexes"]
+                columns = ", ".join(f"{field} TEXT" for field in spec["indexes"])
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} ("
+                    f"seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    f"{spec['key']} TEXT NOT NULL UNIQUE, {columns}, data TEXT NOT NULL)"
+                )
+                for field in fields[1:]:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_{field} ON {name}({field})")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "crop_type TEXT NOT NULL, mandi_id TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (crop_type, mandi_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_prices_mandi_id ON prices(mandi_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            empty = conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 0
+            if empty and self.prices_file:
+                self._put_prices(conn, read_json_array(self.prices_file))
+            self._ready = True
+
+    @contextmanager
+    def transaction(self):
+        """Run a group of writes atomically; nested calls join the outer one"""
+        conn = self._db()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def _row(self, name: str, record: Dict) -> tuple:
+        spec = COLLECTIONS[name]
+        values = [record.get(spec["key"])]
+        values += [record.get(field) for field in spec["indexes"]]
+        values = [None if v is None else str(v) for v in values]
+        return tuple(values) + (_dumps(record),)
+
+    def load(self, name: str) -> List[Dict]:
+        """Return all records of a collection in insertion order"""
+        rows = self._db().execute(f"SELECT data FROM {name} ORDER BY seq")
+        return [_loads(row[0]) for row in rows]
+
+    def _get(self, name: str, key: str) -> Optional[Dict]:
+        key_field = COLLECTIONS[name]["key"]
+        row = self._db().execute(
+            f"SELECT data FROM {name} WHERE {key_field} = ?", (key,)
+        ).fetchone()
+        return _loads(row[0]) if row else None
+
+    def scan(self, name: str, after: Optional[int] = None) -> Iterator[tuple]:
+        """Yield (position, record) for records inserted after a position
+
+        Rows are fetched in chunks on the calling thread's connection, so the
+        generator can be resumed from another thread (e.g. while streaming).
+        """
+        position = after or 0
+        while True:
+            rows = self._db().execute(
+                f"SELECT seq, data FROM {name} WHERE seq > ? ORDER BY seq LIMIT ?",
+                (position, SCAN_CHUNK)
+            ).fetchall()
+            for seq, data in rows:
+                position = seq
+                yield seq, _loads(data)
+            if len(rows) < SCAN_CHUNK:
+                return
+
+    def audit_between(self, start: Optional[datetime], end: Optional[datetime]) -> Iterator[Dict]:
+        """Audit entries with a timestamp in [start, end]"""
+        # Timestamps are stored as str(datetime), which sorts chronologically
+        rows = self._db().execute(
+            "SELECT data FROM audit_log WHERE json_extract(data, '$.timestamp') BETWEEN ? AND ? "
+            "ORDER BY seq",
+            (str(start) if start else "", str(end) if end else "\uffff")
+        ).fetchall()
+        for row in rows:
+            yield _loads(row[0])
+
+    def audit_after(self, afters: List[Optional[int]]) -> List[Optional[Dict]]:
+        """The audit entry following each scan position"""
+        conn = self._db()
+        records = []
+        for after in afters:
+            row = conn.execute(
+                "SELECT data FROM audit_log WHERE seq > ? ORDER BY seq LIMIT 1", (after or 0,)
+            ).fetchone()
+            records.append(_loads(row[0]) if row else None)
+        return records
+
+    def audit_shards(self, size: int) -> List[Dict]:
+        """Split the audit log for parallel reads into runs of `size` entries
+
+        Each shard gives the index of its first entry, the scan position
+        before it and its entry count (None for the last, read to the end).
+        """
+        rows = self._db().execute(
+            "SELECT seq, rn FROM (SELECT seq, ROW_NUMBER() OVER (ORDER BY seq) - 1 AS rn FROM audit_log) "
+            "WHERE rn % ? = 0 ORDER BY seq", (size,)
+        ).fetchall()
+        shards = [{"first_index": rn, "after": seq - 1, "count": size} for seq, rn in rows]
+        if shards:
+            shards[-1]["count"] = None
+        return shards
+
+    def last(self, name: str) -> Optional[Dict]:
+        """Most recently inserted record of a collection"""
+        row = self._db().execute(f"SELECT data FROM {name} ORDER BY seq DESC LIMIT 1").fetchone()
+        return _loads(row[0]) if row else None
+
+    def append(self, name: str, record: Dict):
+        """Insert a record"""
+        self.append_many(name, [record])
+
+    def append_many(self, name: str, records: List[Dict]):
+        """Insert several records in one transaction"""
+        if not records:
+            return
+        spec = COLLECTIONS[name]
+        fields = [spec["key"]] + spec["indexes"] + ["data"]
+        placeholders = ", ".join("?" for _ in fields)
+        rows = [self._row(name, r) for r in records]
+        with self.transaction():
+            self._conn().executemany(
+                f"INSERT INTO {name} ({', '.join(fields)}) VALUES ({placeholders})", rows
+            )
+            note_io(bytes_written=sum(len(row[-1]) for row in rows), records=len(rows))
+            self._bump(self._conn(), name)
+
+    def patch(self, name: str, key: str, updates: Dict):
+        """Merge updates into an existing record"""
+        self.patch_many(name, [(key, updates)])
+
+    def patch_many(self, name: str, patches: List[tuple]):
+        """Merge several (key, updates) pairs in one transaction"""
+        spec = COLLECTIONS[name]
+        assignments = ", ".join(f"{field} = ?" for field in spec["indexes"] + ["data"])
+        with self.transaction():
+            rows = []
+            for key, updates in patches:
+                record = self._get(name, key)
+                if record is None:
+                    continue
+                record.update(json.loads(_dumps(updates)))
+                rows.append(self._row(name, record)[1:] + (key,))
+            self._conn().executemany(
+                f"UPDATE {name} SET {assignments} WHERE {spec['key']} = ?", rows
+            )
+            note_io(bytes_written=sum(len(row[-2]) for row in rows), records=len(rows))
+            self._bump(self._conn(), name)
+
+    def _put_prices(self, conn: sqlite3.Connection, prices: List[Dict]):
+        rows = [(p['crop_type'], p['mandi_id'], _dumps(p)) for p in prices]
+        conn.executemany(
+            "INSERT OR REPLACE INTO prices (crop_type, mandi_id, data) VALUES (?, ?, ?)", rows
+        )
+        note_io(bytes_written=sum(len(row[2]) for row in rows), records=len(rows))
+        self._bump(conn, "prices")
+
+    def _bump(self, conn: sqlite3.Connection, name: str):
+        """Advance the change counter of a table"""
+        conn.execute(
+            "INSERT INTO meta (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1", (name,)
+        )
+
+    def _meta_version(self, name: str) -> int:
+        row = self._db().execute("SELECT version FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def version(self, names: Iterable[str]) -> tuple:
+        """Token that changes whenever any of the named collections is written"""
+        return tuple(self._meta_version(name) for name in names)
+
+    def prices_version(self) -> int:
+        """Counter that changes whenever the price table does"""
+        return self._meta_version("prices")
+
+    def put_prices(self, prices: List[Dict]):
+        """Insert or replace price oracle entries"""
+        with self.transaction():
+            self._put_prices(self._conn(), prices)
+
+    def load_prices(self) -> List[Dict]:
+        """Return all price oracle entries"""
+        rows = self._db().execute("SELECT data FROM prices ORDER BY rowid")
+        return [_loads(row[0]) for row in rows]
+
+    def count(self, name: str) -> int:
+        """Number of records in a collection"""
+        return self._db().execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
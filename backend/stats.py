@@ -0,0 +1,217 @@
+import threading
+from typing import List, Dict
+from repository import repository
+from utils import (
+    STATS_FILE, STATS_FARMERS_FILE, load_state, save_state, state_version,
+    read_state_log, append_state_log, write_state_log
+)
+
+# Token statuses that still count as active
+ACTIVE_STATUSES = ("CREATED", "LISTED")
+
+
+class StatsAggregate:
+    """Running totals behind /api/stats and the compliance report
+
+    The service layer updates the totals on every registration, listing
+    and settlement, and each change is persisted to stats.json. Reading the
+    numbers is therefore O(1). If the saved totals disagree with the
+    repository at startup, or when asked, they are rebuilt from scratch.
+
+    Updates are made inside the caller's write transaction. When stats.json
+    was rewritten by another server worker, the totals are re-read from it
+    before being used or changed.
+
+    stats.json only holds counters, so saving it costs the same however
+    many farmers there are. The set of farmers, needed to count distinct
+    ones, lives in a separate log that new farmer ids are appended to and
+    that each worker reads from where it last stopped.
+    """
+
+    def __init__(self, path: str, farmers_path: str):
+        self.path = path
+        self.farmers_path = farmers_path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._reset()
+
+    def _reset(self):
+        self.total_crops = 0
+        self.total_tokens = 0
+        self.total_settlements = 0
+        self.token_status: Dict[str, int] = {}
+        self.total_volume = 0.0
+        self.completed_settlements = 0
+        self.farmers = set()
+        # Read position in the farmer log and the file it belongs to
+        self._farmers_offset = 0
+        self._farmers_file = None
+
+    def load(self) -> bool:
+        """Restore the saved totals, rebuilding them if they look out of date
+
+        Returns True when the totals were rebuilt from the repository.
+        """
+        with self._lock:
+            version = state_version(self.path)
+            state = load_state(self.path)
+            self._sync_farmers()
+            if state and self._matches_repository(state) and state.get('total_farmers') == len(self.farmers):
+                self._restore(state, version)
+                return False
+            self.rebuild()
+            return True
+
+    def _restore(self, state: Dict, version):
+        self.total_crops = state['total_crops']
+        self.total_tokens = state['total_tokens']
+        self.total_settlements = state['total_settlements']
+        self.token_status = dict(state['token_status_breakdown'])
+        self.total_volume = state['total_settlement_volume']
+        self.completed_settlements = state['completed_settlements']
+        self._version = version
+        self._loaded = True
+
+    def _ensure_loaded(self) -> bool:
+        """Load on first use; True if the totals were just rebuilt"""
+        if not self._loaded:
+            return self.load()
+        version = state_version(self.path)
+        if version != self._version:
+            # Another worker saved newer totals
+            state = load_state(self.path)
+            if state:
+                self._restore(state, version)
+                self._sync_farmers()
+        return False
+
+    def _sync_farmers(self):
+        """Add farmers other workers appended to the log since the last read"""
+        lines, offset, file_id = read_state_log(self.farmers_path, self._farmers_offset, self._farmers_file)
+        if file_id != self._farmers_file:
+            # The log was rewritten by a rebuild
+            self.farmers = set()
+        self.farmers.update(lines)
+        self._farmers_offset, self._farmers_file = offset, file_id
+
+    @staticmethod
+    def _matches_repository(state: Dict) -> bool:
+        try:
+            return (state['total_crops'] == repository.count("crops")
+                    and state['total_tokens'] == repository.count("tokens")
+                    and state['total_settlements'] == repository.count("settlements")
+                    and sum(state['token_status_breakdown'].values()) == state['total_tokens'])
+        except (KeyError, AttributeError, TypeError):
+            return False
+
+    def rebuild(self) -> Dict:
+        """Recompute every total from the repository"""
+        with self._lock:
+            self._reset()
+            for crop in repository.iter_records("crops"):
+                self.total_crops += 1
+                self.farmers.add(crop['farmer_id'])
+            for token in repository.iter_records("tokens"):
+                self.total_tokens += 1
+                self.token_status[token['status']] = self.token_status.get(token['status'], 0) + 1
+            self._add_settlements(list(repository.iter_records("settlements")))
+            self._farmers_offset, self._farmers_file = write_state_log(self.farmers_path, list(self.farmers))
+            self._loaded = True
+            self._save()
+            return self.summary()
+
+    def record_registrations(self, crops: List[Dict], tokens: List[Dict]):
+        """Count newly registered crops and their tokens"""
+        with self._lock:
+            if self._ensure_loaded():
+                return  # rebuilt totals already include this change
+            self.total_crops += len(crops)
+            new_farmers = {c['farmer_id'] for c in crops} - self.farmers
+            if new_farmers:
+                # Logged before the counters, so a crash in between shows up as a mismatch
+                self._farmers_offset, self._farmers_file = append_state_log(self.farmers_path, list(new_farmers))
+                self.farmers.update(new_farmers)
+            self.total_tokens += len(tokens)
+            for token in tokens:
+                self.token_status[token['status']] = self.token_status.get(token['status'], 0) + 1
+            self._save()
+
+    def record_status_change(self, old: str, new: str, count: int = 1):
+        """Move tokens from one status bucket to another"""
+        with self._lock:
+            if self._ensure_loaded():
+                return  # rebuilt totals already include this change
+            self._move_status(old, new, count)
+            self._save()
+
+    def record_settlements(self, settlements: List[Dict]):
+        """Count settlements; their tokens move from LISTED to SETTLED"""
+        with self._lock:
+            if self._ensure_loaded():
+                return  # rebuilt totals already include this change
+            self._add_settlements(settlements)
+            self._move_status("LISTED", "SETTLED", len(settlements))
+            self._save()
+
+    def _add_settlements(self, settlements: List[Dict]):
+        for settlement in settlements:
+            self.total_settlements += 1
+            self.total_volume += settlement['total_amount']
+            if settlement['settlement_status'] == 'COMPLETED':
+                self.completed_settlements += 1
+
+    def _move_status(self, old: str, new: str, count: int):
+        if not count:
+            return
+        remaining = self.token_status.get(old, 0) - count
+        if remaining > 0:
+            self.token_status[old] = remaining
+        else:
+            self.token_status.pop(old, None)
+        self.token_status[new] = self.token_status.get(new, 0) + count
+
+    def version(self):
+        """Token that changes whenever the totals do, in any worker"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._version
+
+    def summary(self) -> Dict:
+        """Figures reported by /api/stats"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "total_crops": self.total_crops,
+                "total_tokens": self.total_tokens,
+                "total_settlements": self.total_settlements,
+                "token_status_breakdown": dict(self.token_status),
+                "total_settlement_volume": self.total_volume,
+                "avg_settlement_value": self.total_volume / self.total_settlements if self.total_settlements else 0
+            }
+
+    def compliance(self) -> Dict:
+        """Figures reported by the compliance report"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "total_registered_farmers": len(self.farmers),
+                "total_active_tokens": sum(self.token_status.get(s, 0) for s in ACTIVE_STATUSES),
+                "total_completed_settlements": self.completed_settlements
+            }
+
+    def _save(self):
+        save_state(self.path, {
+            "total_crops": self.total_crops,
+            "total_tokens": self.total_tokens,
+            "total_settlements": self.total_settlements,
+            "token_status_breakdown": self.token_status,
+            "total_settlement_volume": self.total_volume,
+            "completed_settlements": self.completed_settlements,
+            "total_farmers": len(self.farmers)
+        })
+        self._version = state_version(self.path)
+
+
+# Shared instance updated by the service layer
+stats = StatsAggregate(STATS_FILE, STATS_FARMERS_FILE)
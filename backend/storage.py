@@ -0,0 +1,884 @@
+import gzip
+import io
+import json
+import os
+import threading
+import zlib
+from bisect import bisect_right
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Iterator, Optional, Iterable
+from metrics import note_io
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; only threads are serialized there
+    fcntl = None
+
+# Operations a collection log may accumulate before it is folded into a snapshot
+SNAPSHOT_AFTER_OPS = 10000
+# Entries per segment of a segmented log before it is closed and compressed
+SEGMENT_ENTRIES = 10000
+# Uncompressed bytes between the points a closed segment can be inflated from
+SEEK_POINT_BYTES = 64 * 1024
+# Low bits of a segmented-log position hold the byte offset within the segment
+_OFFSET_BITS = 40
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+# Stored collections: primary key and the fields backends should index
+COLLECTIONS = {
+    "crops": {"key": "crop_id", "indexes": ["farmer_id", "mandi_id", "crop_type"]},
+    "tokens": {"key": "token_id", "indexes": ["linked_crop_id", "owner_id", "status"]},
+    "settlements": {"key": "settlement_id", "indexes": ["token_id", "seller_id", "buyer_id"]},
+    "bids": {"key": "bid_id", "indexes": ["buyer_id", "status", "crop_type"]},
+    "audit_log": {"key": "event_id", "indexes": ["event_type", "actor"]},
+    "price_ticks": {"key": "tick_id", "indexes": ["crop_type", "mandi_id"]},
+}
+# Append-only collections the JSON backend keeps as segmented logs
+SEGMENTED_LOGS = ("audit_log", "price_ticks")
+
+
+def read_json_array(file_path: str) -> List[Dict]:
+    """Load a JSON array from file"""
+    try:
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                content = f.read()
+                if not content.strip():
+                    return []
+                records = json.loads(content)
+                note_io(bytes_read=len(content), records=len(records))
+                return records
+        return []
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return []
+
+
+def _file_version(path: str) -> Optional[tuple]:
+    """Token that changes whenever a file is appended to or replaced"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except FileNotFoundError:
+        return None
+
+
+class InterProcessLock:
+    """Re-entrant lock shared by threads and by processes using the same file
+
+    Threads queue on an RLock; the outermost holder also takes an exclusive
+    fcntl lock on `path`, so several server workers on one data directory
+    apply their writes one at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                if self._file is None:
+                    directory = os.path.dirname(self.path)
+                    if directory and not os.path.exists(directory):
+                        os.makedirs(directory, exist_ok=True)
+                    self._file = open(self.path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            self._depth += 1
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._depth -= 1
+            if self._depth == 0 and self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+
+class RawJSON(str):
+    """Record field already serialized as JSON, written out as-is instead of re-encoded"""
+
+
+_COMPACT_JSON = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+def encode_record(record: Dict) -> str:
+    """Compact JSON of a record, copying RawJSON fields through unchanged"""
+    if not any(isinstance(value, RawJSON) for value in record.values()):
+        return _COMPACT_JSON.encode(record)
+    return "{" + ",".join(
+        f"{_COMPACT_JSON.encode(key)}:{value if isinstance(value, RawJSON) else _COMPACT_JSON.encode(value)}"
+        for key, value in record.items()
+    ) + "}"
+
+
+def _encode(op: Dict) -> str:
+    """Serialize one log operation as a compact JSON line"""
+    return _COMPACT_JSON.encode(op) + "\n"
+
+
+def _encode_put(record: Dict) -> str:
+    """Serialize a put of one record as a compact JSON line"""
+    return f'{{"op":"put","data":{encode_record(record)}}}\n'
+
+
+def _scan_puts(f, position: int, path: str) -> Iterator[tuple]:
+    """Yield (offset after line, record) for put lines from a binary file positioned at `position`"""
+    for line in f:
+        if not line.endswith(b"\n"):
+            break  # write still in progress
+        position += len(line)
+        if not line.strip():
+            continue
+        try:
+            op = json.loads(line)
+        except ValueError:
+            print(f"Skipping corrupt line in {path}")
+            continue
+        if op.get('op') == 'put':
+            note_io(bytes_read=len(line), records=1)
+            yield position, op['data']
+
+
+def _last_put(path: str) -> Optional[Dict]:
+    """Record of the last complete line of a log, reading only its tail"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0:
+            step = min(8192, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+            note_io(bytes_read=step)
+            complete = data[:data.rfind(b"\n") + 1]  # ignore a torn tail
+            if position == 0 or complete.count(b"\n") >= 2:
+                lines = complete.split(b"\n")
+                if len(lines) < 2:
+                    return None
+                op = json.loads(lines[-2])
+                if op.get('op') != 'put':
+                    return None
+                note_io(records=1)
+                return op['data']
+    return None
+
+
+def _append_lines(path: str, payload: bytes, sync: bool = False):
+    """Append complete lines, first cutting off a line left unfinished by a crash"""
+    with open(path, 'ab+') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                _truncate_torn_tail(f, end)
+        f.write(payload)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+
+
+def _truncate_torn_tail(f, end: int):
+    """Drop the bytes after the last newline of a file opened for update"""
+    position = end
+    while position > 0:
+        step = min(8192, position)
+        position -= step
+        f.seek(position)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            f.truncate(position + newline + 1)
+            return
+    f.truncate(0)
+
+
+def _parse_time(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class JsonlCollection:
+    """One collection kept as a snapshot plus a write-ahead log
+
+    `<name>.snapshot.json` holds every record as of some point as a single
+    minified JSON document. `<name>.jsonl` logs the mutations since then, one
+    per line: ``{"op": "put", "data": record}`` inserts a record and
+    ``{"op": "patch", "key": id, "data": updates}`` merges updates into an
+    existing one. Writes only ever append to the log; loading reads the
+    snapshot and replays the log. Once the log holds `snapshot_after`
+    operations a background thread folds it into a new snapshot and starts
+    a new log with whatever was appended meanwhile, so restart time is
+    bounded by the snapshot size plus at most that many operations.
+
+    Snapshot and log carry a generation number (the log in a header line).
+    The snapshot is replaced before the log, and replaying a log over the
+    snapshot built from it changes nothing, so a crash or a reader caught
+    between the two renames still sees every record. A line cut short by a
+    crash is never treated as written and is cut off before the next append.
+    """
+
+    def __init__(self, path: str, key_field: str, legacy_path: Optional[str] = None,
+                 snapshot_after: int = SNAPSHOT_AFTER_OPS,
+                 write_lock: Optional[InterProcessLock] = None, sync: bool = False):
+        self.path = path
+        self.snapshot_path = os.path.splitext(path)[0] + ".snapshot.json"
+        self.key_field = key_field
+        self.legacy_path = legacy_path
+        self.snapshot_after = snapshot_after
+        # Store-wide lock a background snapshot must hold, like any writer
+        self.write_lock = write_lock
+        # fsync every append, not just snapshots
+        self.sync = sync
+        self._lock = threading.RLock()
+        self._log_ops = 0
+        self._snapshotting = False
+
+    def ensure(self):
+        """Create the log, importing the legacy JSON array on first use"""
+        if os.path.exists(self.path):
+            return
+        with self.write_lock or nullcontext(), self._lock:
+            if os.path.exists(self.path):
+                return
+            records = read_json_array(self.legacy_path) if self.legacy_path else []
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._write_snapshot(1, records)
+            self._write_log(1, b"")
+
+    def _read_snapshot(self) -> tuple:
+        """(generation, records) of the snapshot; generation 0 when there is none"""
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0, []
+        snapshot = json.loads(data)
+        note_io(bytes_read=len(data))
+        return snapshot['generation'], snapshot['records']
+
+    def _read_log(self, end: Optional[int] = None) -> tuple:
+        """(generation, operations) of the log, up to byte `end` if given
+
+        Logs written before snapshots existed have no header: generation 0.
+        """
+        with open(self.path, 'rb') as f:
+            data = f.read() if end is None else f.read(end)
+        note_io(bytes_read=len(data))
+        generation = 0
+        ops = []
+        # The last line is incomplete unless the data ends with a newline
+        for line in data.split(b"\n")[:-1]:
+            if not line.strip():
+                continue
+            try:
+                op = json.loads(line)
+            except ValueError:
+                print(f"Skipping corrupt line in {self.path}")
+                continue
+            if op.get('op') == 'log':
+                generation = op['generation']
+            else:
+                ops.append(op)
+        return generation, ops
+
+    def _log_generation(self) -> int:
+        """Generation in the header line of the log"""
+        with open(self.path, 'rb') as f:
+            first = f.readline()
+        try:
+            op = json.loads(first)
+        except ValueError:
+            return 0
+        return op['generation'] if op.get('op') == 'log' else 0
+
+    def _replay(self, records: List[Dict], ops: List[Dict]) -> Dict[str, Dict]:
+        """Apply logged operations to snapshot records; applying twice is harmless"""
+        table = {record[self.key_field]: record for record in records}
+        for op in ops:
+            if op.get('op') == 'put':
+                record = op['data']
+                table[record[self.key_field]] = record
+            elif op.get('op') == 'patch':
+                record = table.get(op['key'])
+                if record is not None:
+                    record.update(op['data'])
+        return table
+
+    def _materialize(self) -> Dict[str, Dict]:
+        """Snapshot plus log, keyed by the collection key"""
+        for _ in range(5):
+            snapshot_generation, records = self._read_snapshot()
+            log_generation, ops = self._read_log()
+            # A snapshot one ahead of its log was switched in just before the
+            # log; anything else means a switch happened between the reads
+            if snapshot_generation in (log_generation, log_generation + 1):
+                self._log_ops = len(ops)
+                return self._replay(records, ops)
+        raise ValueError(
+            f"{self.snapshot_path} (generation {snapshot_generation}) does not match "
+            f"{self.path} (generation {log_generation})"
+        )
+
+    def version(self) -> Optional[tuple]:
+        """Token that changes whenever the log is written"""
+        return _file_version(self.path)
+
+    def load(self) -> List[Dict]:
+        """Return all records in insertion order"""
+        with self._lock:
+            self.ensure()
+            records = list(self._materialize().values())
+            note_io(records=len(records))
+            return records
+
+    def scan(self, after: Optional[int] = None) -> Iterator[tuple]:
+        """Yield (position, record) for each record logged after a position
+
+        Positions are byte offsets just past each line, so a later scan can
+        resume where an earlier one stopped. Only the log since the last
+        snapshot is read and patches are not applied.
+        """
+        self.ensure()
+        position = after or 0
+        with open(self.path, 'rb') as f:
+            f.seek(position)
+            yield from _scan_puts(f, position, self.path)
+
+    def last(self) -> Optional[Dict]:
+        """Return the most recently appended record"""
+        with self._lock:
+            self.ensure()
+            record = _last_put(self.path)
+            if record is None:
+                _, records = self._read_snapshot()
+                record = records[-1] if records else None
+            return record
+
+    def append(self, record: Dict):
+        """Append a new record"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]):
+        """Append several records with a single write"""
+        if not records:
+            return
+        self._append("".join(_encode_put(r) for r in records), len(records))
+
+    def patch(self, key: str, updates: Dict):
+        """Append a delta record for an existing record"""
+        self.patch_many([(key, updates)])
+
+    def patch_many(self, patches: List[tuple]):
+        """Append delta records for several (key, updates) pairs in one write"""
+        if not patches:
+            return
+        self._append("".join(_encode({"op": "patch", "key": k, "data": u}) for k, u in patches), len(patches))
+
+    def _append(self, payload: str, count: int):
+        with self.write_lock or nullcontext(), self._lock:
+            self.ensure()
+            _append_lines(self.path, payload.encode(), self.sync)
+            note_io(bytes_written=len(payload), records=count)
+            self._log_ops += count
+            if self._log_ops >= self.snapshot_after and not self._snapshotting:
+                self._snapshotting = True
+                threading.Thread(target=self.snapshot, daemon=True).start()
+
+    def snapshot(self):
+        """Fold the log into a new snapshot and restart the log after it
+
+        Only noting where the log ends and the final switch hold the write
+        lock; building and writing the snapshot does not block writers.
+        """
+        try:
+            with self.write_lock or nullcontext(), self._lock:
+                self.ensure()
+                covered = os.path.getsize(self.path)
+                log_generation = self._log_generation()
+            generation, records = self._read_snapshot()
+            read_generation, ops = self._read_log(covered)
+            # Generations only grow, so they tell whether the log was switched
+            if read_generation != log_generation or generation not in (log_generation, log_generation + 1):
+                return  # another process switched in the meantime
+            generation = log_generation + 1
+            records = list(self._replay(records, ops).values())
+            staged = self._write_snapshot(generation, records, stage=True)
+
+            with self.write_lock or nullcontext(), self._lock:
+                if self._log_generation() != log_generation:
+                    os.remove(staged)
+                    return  # another process switched first
+                with open(self.path, 'rb') as f:
+                    f.seek(covered)
+                    tail = f.read()
+                tail = tail[:tail.rfind(b"\n") + 1]
+                os.replace(staged, self.snapshot_path)
+                self._write_log(generation, tail)
+                self._log_ops = tail.count(b"\n")
+        except Exception as e:
+            print(f"Error snapshotting {self.path}: {e}")
+        finally:
+            self._snapshotting = False
+
+    def _write_snapshot(self, generation: int, records: List[Dict], stage: bool = False) -> str:
+        """Write a snapshot durably; a staged one is left aside for the caller to move in"""
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"generation": generation, "records": records}, f, default=str, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        if stage:
+            return tmp_path
+        os.replace(tmp_path, self.snapshot_path)
+        return self.snapshot_path
+
+    def _write_log(self, generation: int, tail: bytes):
+        """Atomically start a new log of the given generation holding `tail`"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_encode({"op": "log", "generation": generation}).encode() + tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class SegmentedLog:
+    """Append-only log split into fixed-size, compressed segments
+
+    New records go to the active segment, a plain JSON Lines file. Once it
+    holds `segment_entries` records it is closed: gzip-compressed and
+    summarized in manifest.json (record count, size, first/last event and
+    hash, time range). Appends therefore only touch the active segment, and
+    readers open closed segments lazily, skipping any they do not need.
+    Positions combine the segment number with a byte offset inside the
+    uncompressed segment.
+    """
+
+    def __init__(self, directory: str, key_field: str, legacy_paths: Iterable[str] = (),
+                 segment_entries: int = SEGMENT_ENTRIES,
+                 write_lock: Optional[InterProcessLock] = None, sync: bool = False):
+        self.directory = directory
+        self.key_field = key_field
+        self.legacy_paths = list(legacy_paths)
+        self.segment_entries = segment_entries
+        self.write_lock = write_lock
+        self.sync = sync
+        self._lock = threading.RLock()
+        self._manifest: List[Dict] = []
+        self._manifest_version = None
+        # (segment, bytes, records) of the active segment as last seen
+        self._active_state = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def segment_path(self, segment: int, closed: bool) -> str:
+        name = f"segment-{segment:06d}.jsonl"
+        return os.path.join(self.directory, name + ".gz" if closed else name)
+
+    def ensure(self):
+        """Create the log, importing a legacy log or JSON array on first use"""
+        if os.path.isdir(self.directory):
+            return
+        with self.write_lock or nullcontext(), self._lock:
+            if os.path.isdir(self.directory):
+                return
+            legacy = next((p for p in self.legacy_paths if os.path.exists(p)), None)
+            records = []
+            if legacy and legacy.endswith(".jsonl"):
+                records = JsonlCollection(legacy, self.key_field).load()
+            elif legacy:
+                records = read_json_array(legacy)
+            # Build the segments aside and move them in whole
+            staging = self.directory + ".tmp"
+            if os.path.isdir(staging):
+                for name in os.listdir(staging):
+                    os.remove(os.path.join(staging, name))
+            else:
+                os.makedirs(staging)
+            SegmentedLog(staging, self.key_field, segment_entries=self.segment_entries).append_many(records)
+            os.rename(staging, self.directory)
+            if legacy and legacy.endswith(".jsonl"):
+                os.replace(legacy, legacy + ".imported")
+
+    def segments(self) -> List[Dict]:
+        """Summaries of the closed segments, re-read when another process changed them"""
+        version = _file_version(self.manifest_path)
+        if version != self._manifest_version:
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    manifest = json.load(f)['segments']
+            except FileNotFoundError:
+                manifest = []
+            self._manifest = manifest
+            self._manifest_version = version
+        return self._manifest
+
+    def _active_segment(self, closed: List[Dict]) -> int:
+        return closed[-1]['segment'] + 1 if closed else 1
+
+    def _active_count(self, segment: int) -> int:
+        """Records in the active segment, counting only bytes added since last time"""
+        path = self.segment_path(segment, False)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        seen_segment, seen_size, count = self._active_state or (segment, 0, 0)
+        if seen_segment != segment or seen_size > size:
+            seen_size, count = 0, 0
+        if size > seen_size:
+            with open(path, 'rb') as f:
+                f.seek(seen_size)
+                count += f.read(size - seen_size).count(b"\n")
+        self._active_state = (segment, size, count)
+        return count
+
+    def _open(self, segment: int, closed: bool):
+        if not closed:
+            try:
+                return open(self.segment_path(segment, False), 'rb')
+            except FileNotFoundError:
+                pass  # closed since the manifest was read
+        return gzip.open(self.segment_path(segment, True), 'rb')
+
+    def _read_segment(self, segment: int, summary: Optional[Dict], offset: int = 0) -> Iterator[tuple]:
+        """Yield (position, record) from one segment, starting at a byte offset"""
+        if summary is not None and offset >= summary['bytes']:
+            return
+        path = self.segment_path(segment, summary is not None)
+        try:
+            f = self._open(segment, summary is not None)
+        except FileNotFoundError:
+            return  # nothing written to the active segment yet
+        with f:
+            f.seek(offset)
+            for position, record in _scan_puts(f, offset, path):
+                yield (segment << _OFFSET_BITS) | position, record
+
+    def scan(self, after: Optional[int] = None) -> Iterator[tuple]:
+        """Yield (position, record) for each record appended after a position"""
+        self.ensure()
+        with self._lock:
+            closed = list(self.segments())
+        first = closed[0]['segment'] if closed else 1
+        active = self._active_segment(closed)
+        segment, offset = (after >> _OFFSET_BITS, after & _OFFSET_MASK) if after else (first, 0)
+        if segment < first:
+            segment, offset = first, 0
+        while segment <= active:
+            summary = closed[segment - first] if segment < active else None
+            yield from self._read_segment(segment, summary, offset)
+            segment, offset = segment + 1, 0
+
+    def scan_between(self, start: Optional[datetime], end: Optional[datetime]) -> Iterator[Dict]:
+        """Yield records whose timestamp lies in [start, end], skipping whole segments"""
+        self.ensure()
+        with self._lock:
+            closed = list(self.segments())
+        parts = [(summary['segment'], summary) for summary in closed]
+        parts.append((self._active_segment(closed), None))
+        for segment, summary in parts:
+            if summary is not None:
+                first, last = _parse_time(summary['start_time']), _parse_time(summary['end_time'])
+                if (start and last and last < start) or (end and first and first > end):
+                    continue
+            for _, record in self._read_segment(segment, summary):
+                timestamp = _parse_time(record.get('timestamp'))
+                if timestamp is None or (start and timestamp < start) or (end and timestamp > end):
+                    continue
+                yield record
+
+    def read_after(self, afters: List[Optional[int]]) -> List[Optional[Dict]]:
+        """The record following each scan position, or None past the end
+
+        Positions are grouped by segment and read in file order, so a closed
+        segment is decompressed at most once however many records it yields.
+        """
+        self.ensure()
+        with self._lock:
+            closed = list(self.segments())
+        first = closed[0]['segment'] if closed else 1
+        active = self._active_segment(closed)
+        wanted: Dict[int, List[tuple]] = {}
+        for i, after in enumerate(afters):
+            segment, offset = (after >> _OFFSET_BITS, after & _OFFSET_MASK) if after else (first, 0)
+            if segment < first:
+                segment, offset = first, 0
+            # The end of a closed segment is the start of the next one
+            if segment < active and offset >= closed[segment - first]['bytes']:
+                segment, offset = segment + 1, 0
+            wanted.setdefault(segment, []).append((offset, i))
+
+        records: List[Optional[Dict]] = [None] * len(afters)
+        for segment, items in sorted(wanted.items()):
+            summary = closed[segment - first] if segment < active else None
+            if summary is not None and summary.get('seek_points'):
+                for offset, i in items:
+                    line = self._closed_line(summary, offset)
+                    for _, record in _scan_puts(io.BytesIO(line), offset, self.directory):
+                        records[i] = record
+                continue
+            try:
+                f = self._open(segment, segment < active)
+            except FileNotFoundError:
+                continue  # nothing written to the active segment yet
+            with f:
+                for offset, i in sorted(items):
+                    f.seek(offset)
+                    for _, record in _scan_puts(f, offset, self.directory):
+                        records[i] = record
+                        break
+        return records
+
+    def _closed_line(self, summary: Dict, offset: int) -> bytes:
+        """The line at an uncompressed offset of a closed segment, inflated from the nearest seek point"""
+        points = summary['seek_points']
+        start, compressed = points[bisect_right([p[0] for p in points], offset) - 1]
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        data = b""
+        with open(self.segment_path(summary['segment'], True), 'rb') as f:
+            f.seek(compressed)
+            while True:
+                chunk = f.read(16384)
+                data += inflater.decompress(chunk) if chunk else inflater.flush()
+                end = data.find(b"\n", offset - start)
+                if end != -1 or not chunk or inflater.eof:
+                    break
+        return data[offset - start:end + 1] if end != -1 else b""
+
+    def version(self) -> tuple:
+        """Token that changes whenever a record is appended or a segment closed"""
+        active = self._active_segment(self.segments())
+        return _file_version(self.manifest_path), _file_version(self.segment_path(active, False))
+
+    def load(self) -> List[Dict]:
+        """Return all records in insertion order"""
+        return [record for _, record in self.scan()]
+
+    def shards(self) -> List[Dict]:
+        """One shard per segment: first record index, scan position before it, record count"""
+        self.ensure()
+        with self._lock:
+            closed = list(self.segments())
+        shards = [
+            {"first_index": s['first_index'], "after": s['segment'] << _OFFSET_BITS, "count": s['records']}
+            for s in closed
+        ]
+        # The active segment is read to its end, whatever it holds by then
+        shards.append({
+            "first_index": closed[-1]['first_index'] + closed[-1]['records'] if closed else 0,
+            "after": self._active_segment(closed) << _OFFSET_BITS,
+            "count": None
+        })
+        return shards
+
+    def last(self) -> Optional[Dict]:
+        """Most recently appended record, read from the tail of the newest segment"""
+        self.ensure()
+        with self._lock:
+            closed = self.segments()
+            path = self.segment_path(self._active_segment(closed), False)
+            if os.path.exists(path):
+                record = _last_put(path)
+                if record is not None:
+                    return record
+            if not closed:
+                return None
+            last = None
+            with self._open(closed[-1]['segment'], True) as f:
+                for _, record in _scan_puts(f, 0, self.directory):
+                    last = record
+            return last
+
+    def append(self, record: Dict):
+        """Append a new record"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]):
+        """Append records to the active segment, closing segments as they fill"""
+        if not records:
+            return
+        with self.write_lock or nullcontext(), self._lock:
+            if not os.path.isdir(self.directory):
+                self.ensure()
+            while records:
+                segment = self._active_segment(self.segments())
+                room = self.segment_entries - self._active_count(segment)
+                if room <= 0:
+                    self._close(segment)
+                    continue
+                chunk, records = records[:room], records[room:]
+                payload = "".join(_encode_put(r) for r in chunk)
+                _append_lines(self.segment_path(segment, False), payload.encode(), self.sync)
+                note_io(bytes_written=len(payload), records=len(chunk))
+
+    def _close(self, segment: int):
+        """Compress the full active segment and record it in the manifest"""
+        plain = self.segment_path(segment, False)
+        with open(plain, 'rb') as f:
+            data = f.read()
+        records = [json.loads(line)['data'] for line in data.splitlines() if line.strip()]
+        times = [t for t in (_parse_time(r.get('timestamp')) for r in records) if t is not None]
+        closed = self.segments()
+        summary = {
+            "segment": segment,
+            "file": os.path.basename(self.segment_path(segment, True)),
+            "records": len(records),
+            "bytes": len(data),
+            "first_index": closed[-1]['first_index'] + closed[-1]['records'] if closed else 0,
+            "first_key": records[0].get(self.key_field),
+            "last_key": records[-1].get(self.key_field),
+            "first_previous_hash": records[0].get('previous_hash'),
+            "last_hash": records[-1].get('current_hash'),
+            "start_time": str(min(times)) if times else None,
+            "end_time": str(max(times)) if times else None
+        }
+
+        # A full flush every SEEK_POINT_BYTES lets readers start inflating there
+        seek_points = []
+        tmp_path = f"{self.segment_path(segment, True)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                for start in range(0, len(data), SEEK_POINT_BYTES):
+                    seek_points.append([start, raw.tell()])
+                    f.write(data[start:start + SEEK_POINT_BYTES])
+                    f.flush(zlib.Z_FULL_FLUSH)
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, self.segment_path(segment, True))
+        summary["seek_points"] = seek_points
+
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"segments": closed + [summary]}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        # Readers that already opened the plain file keep reading it
+        os.remove(plain)
+        self._active_state = None
+
+
+class JsonlStore:
+    """Storage backend keeping each collection as a snapshot plus a JSON Lines log
+
+    The audit log, which only ever grows, is a SegmentedLog in the
+    `audit_log/` directory instead. Writes are serialized across threads
+    and processes by an fcntl lock on `.write.lock` in the data directory,
+    so several server workers can share one data directory.
+    """
+
+    def __init__(self, data_dir: str, prices_file: str, audit_segment_entries: int = SEGMENT_ENTRIES,
+                 snapshot_after: int = SNAPSHOT_AFTER_OPS, sync: bool = False):
+        self.data_dir = data_dir
+        self.prices_file = prices_file
+        self._lock = InterProcessLock(os.path.join(data_dir, ".write.lock"))
+        self.collections = {
+            name: JsonlCollection(
+                os.path.join(data_dir, f"{name}.jsonl"), spec["key"],
+                legacy_path=os.path.join(data_dir, f"{name}.json"),
+                snapshot_after=snapshot_after, write_lock=self._lock, sync=sync
+            )
+            for name, spec in COLLECTIONS.items() if name not in SEGMENTED_LOGS
+        }
+        self.collections["audit_log"] = SegmentedLog(
+            os.path.join(data_dir, "audit_log"), COLLECTIONS["audit_log"]["key"],
+            legacy_paths=[os.path.join(data_dir, "audit_log.jsonl"), os.path.join(data_dir, "audit_log.json")],
+            segment_entries=audit_segment_entries, write_lock=self._lock, sync=sync
+        )
+        self.collections["price_ticks"] = SegmentedLog(
+            os.path.join(data_dir, "price_ticks"), COLLECTIONS["price_ticks"]["key"],
+            segment_entries=audit_segment_entries, write_lock=self._lock, sync=sync
+        )
+
+    def ensure(self):
+        """Create any missing logs"""
+        with self._lock:
+            for collection in self.collections.values():
+                collection.ensure()
+
+    def version(self, names: Iterable[str]) -> tuple:
+        """Token that changes whenever any of the named collections is written"""
+        return tuple(self.collections[name].version() for name in names)
+
+    def load(self, name: str) -> List[Dict]:
+        """Return all records of a collection"""
+        return self.collections[name].load()
+
+    def scan(self, name: str, after: Optional[int] = None) -> Iterator[tuple]:
+        """Yield (position, record) for records appended after a position"""
+        return self.collections[name].scan(after)
+
+    def last(self, name: str) -> Optional[Dict]:
+        """Most recently appended record of an append-only collection"""
+        return self.collections[name].last()
+
+    def audit_between(self, start: Optional[datetime], end: Optional[datetime]) -> Iterator[Dict]:
+        """Audit entries with a timestamp in [start, end]"""
+        return self.collections["audit_log"].scan_between(start, end)
+
+    def audit_after(self, afters: List[Optional[int]]) -> List[Optional[Dict]]:
+        """The audit entry following each scan position"""
+        return self.collections["audit_log"].read_after(afters)
+
+    def audit_shards(self, size: int) -> List[Dict]:
+        """Split the audit log for parallel reads; segments are the shards, so size is unused"""
+        return self.collections["audit_log"].shards()
+
+    def append(self, name: str, record: Dict):
+        """Insert a record"""
+        self.collections[name].append(record)
+
+    def append_many(self, name: str, records: List[Dict]):
+        """Insert several records with one write"""
+        self.collections[name].append_many(records)
+
+    def patch(self, name: str, key: str, updates: Dict):
+        """Merge updates into an existing record"""
+        self.collections[name].patch(key, updates)
+
+    def patch_many(self, name: str, patches: List[tuple]):
+        """Merge several (key, updates) pairs with one write"""
+        self.collections[name].patch_many(patches)
+
+    def load_prices(self) -> List[Dict]:
+        """Return all price oracle entries"""
+        return read_json_array(self.prices_file)
+
+    def put_prices(self, prices: List[Dict]):
+        """Insert or replace oracle entries by (crop_type, mandi_id)"""
+        with self._lock:
+            table = {(p['crop_type'], p['mandi_id']): p for p in self.load_prices()}
+            for price in prices:
+                table[(price['crop_type'], price['mandi_id'])] = price
+            tmp_path = f"{self.prices_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(list(table.values()), f, indent=2, default=str)
+                note_io(bytes_written=f.tell(), records=len(prices))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.prices_file)
+
+    def prices_version(self):
+        """Token that changes whenever the price file does"""
+        return _file_version(self.prices_file)
+
+    @contextmanager
+    def transaction(self):
+        """Serialize a group of writes across threads and processes
+
+        The logs give no cross-file atomicity.
+        """
+        with self._lock:
+            yield
@@ -0,0 +1,142 @@
+"""Hammer one data directory from several processes and check nothing broke
+
+Usage:
+    python stress_workers.py [--workers N] [--ops N] [--backend json|sqlite] [--keep]
+
+Each process plays the part of one uvicorn worker: it imports the service
+layer on its own and registers, lists and buys crops as fast as it can,
+with every process competing for the same pool of listed tokens. When all
+of them are done the script checks that the audit chain verifies end to
+end, that no record was lost, that no token was sold twice and that the
+shared statistics match a rebuild. Exits with status 1 on any failure.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from config import DATA_DIR
+
+
+def _worker(worker: int, ops: int, pool: list) -> dict:
+    from models import CropRegistrationRequest, TokenListingRequest, TradeAcceptanceRequest
+    from services import CropTokenizationService
+
+    rng = random.Random(worker)
+    bought = 0
+    for i in range(ops):
+        result = CropTokenizationService.register_crop(CropRegistrationRequest(
+            farmer_id=f"STRESS-F{worker}",
+            crop_type=rng.choice(["wheat", "rice", "cotton"]),
+            quantity=rng.randint(100, 2000),
+            quality_grade=rng.choice(["A", "B", "C"]),
+            mandi_id="PUNE-MKT-01"
+        ))
+        token = result['token']
+        CropTokenizationService.list_token(TokenListingRequest(
+            token_id=token['token_id'], seller_id=token['owner_id']
+        ))
+        trade = CropTokenizationService.execute_trade(TradeAcceptanceRequest(
+            token_id=rng.choice(pool), buyer_id=f"STRESS-B{worker}-{i}"
+        ))
+        bought += trade['success']
+    return {"registered": ops, "bought": bought}
+
+
+def _seed(count: int) -> list:
+    """List `count` tokens for the workers to fight over"""
+    from models import CropRegistrationRequest, TokenListingRequest
+    from services import CropTokenizationService
+
+    pool = []
+    for i in range(count):
+        token = CropTokenizationService.register_crop(CropRegistrationRequest(
+            farmer_id="STRESS-SEED", crop_type="wheat", quantity=500,
+            quality_grade="A", mandi_id="PUNE-MKT-01"
+        ))['token']
+        CropTokenizationService.list_token(TokenListingRequest(
+            token_id=token['token_id'], seller_id=token['owner_id']
+        ))
+        pool.append(token['token_id'])
+    return pool
+
+
+def _check(expected_crops: int, bought: int, pool: list) -> list:
+    """Failures found in the shared data directory"""
+    from repository import repository
+    from services import CropTokenizationService
+    from stats import stats
+
+    failures = []
+    audit = CropTokenizationService.verify_audit_integrity(full=True)
+    if not audit['valid']:
+        failures.append(f"audit chain broken: {audit}")
+
+    repository.load()
+    crops = repository.count("crops")
+    if crops != expected_crops:
+        failures.append(f"expected {expected_crops} crops, found {crops}")
+
+    settlements = list(repository.iter_records("settlements"))
+    sold = [s['token_id'] for s in settlements]
+    if len(sold) != len(set(sold)):
+        failures.append(f"{len(sold) - len(set(sold))} tokens were sold more than once")
+    if len(settlements) != bought:
+        failures.append(f"workers reported {bought} purchases, storage holds {len(settlements)}")
+    if bought > len(pool):
+        failures.append(f"{bought} purchases from a pool of {len(pool)} tokens")
+
+    shared = stats.summary()
+    if shared != stats.rebuild():
+        failures.append(f"shared statistics drifted from the data: {shared}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress one data directory from several processes")
+    parser.add_argument("--workers", type=int, default=4, help="number of competing processes")
+    parser.add_argument("--ops", type=int, default=100, help="register/list/buy rounds per process")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch data directory")
+    args = parser.parse_args()
+
+    # Children inherit the environment, so they all open the scratch directory
+    data_dir = tempfile.mkdtemp(prefix="dhara-stress-")
+    shutil.copy(os.path.join(DATA_DIR, "prices.json"), data_dir)
+    os.environ["DHARA_DATA_DIR"] = data_dir
+    os.environ["DHARA_SQLITE_PATH"] = os.path.join(data_dir, "dhara.db")
+    os.environ["DHARA_STORAGE_BACKEND"] = args.backend
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as setup:
+        pool = setup.apply(_seed, (args.workers * 2,))
+
+    started = time.perf_counter()
+    with context.Pool(args.workers) as workers:
+        results = workers.starmap(_worker, [(w, args.ops, pool) for w in range(args.workers)])
+    elapsed = time.perf_counter() - started
+
+    registered = sum(r['registered'] for r in results)
+    bought = sum(r['bought'] for r in results)
+    print(f"{args.workers} workers: {registered} registrations, {bought} purchases in {elapsed:.1f}s")
+
+    with context.Pool(1) as checker:
+        failures = checker.apply(_check, (len(pool) + registered, bought, pool))
+
+    if args.keep:
+        print(f"Data left in {data_dir}")
+    else:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK: audit chain intact, no lost writes, no double sales, statistics consistent")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,122 +1,322 @@
 import json
 import os
-from datetime import datetime
 from typing import List, Dict, Any
 import hashlib
+import threading
+from datetime import datetime
+from config import (
+    BASE_DIR, DATA_DIR, STORAGE_BACKEND, SQLITE_PATH, PRICE_CACHE_TTL, PRICE_MAX_AGE,
+    NODE_ID, AUDIT_SEGMENT_SIZE, SNAPSHOT_AFTER, SYNC_WRITES
+)
+from storage import JsonlStore
+from ids import IdAllocator
+from oracle import PriceOracleCache
+from metrics import timed, note_io
 
 # File paths - Fixed version
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
 CROPS_FILE = os.path.join(DATA_DIR, "crops.json")
 TOKENS_FILE = os.path.join(DATA_DIR, "tokens.json")
 SETTLEMENTS_FILE = os.path.join(DATA_DIR, "settlements.json")
 AUDIT_LOG_FILE = os.path.join(DATA_DIR, "audit_log.json")
 PRICES_FILE = os.path.join(DATA_DIR, "prices.json")
+AUDIT_CHECKPOINT_FILE = os.path.join(DATA_DIR, "audit_checkpoint.json")
+STATS_FILE = os.path.join(DATA_DIR, "stats.json")
+STATS_FARMERS_FILE = os.path.join(DATA_DIR, "stats_farmers.log")
+
+def _open_store():
+    """Create the storage backend selected by DHARA_STORAGE_BACKEND"""
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteStore
+        return SqliteStore(SQLITE_PATH, PRICES_FILE)
+    if STORAGE_BACKEND == "json":
+        return JsonlStore(DATA_DIR, PRICES_FILE, audit_segment_entries=AUDIT_SEGMENT_SIZE,
+                          snapshot_after=SNAPSHOT_AFTER, sync=SYNC_WRITES)
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+# Collections mirrored by the repository, in data_version() order
+DATA_COLLECTIONS = ("crops", "tokens", "settlements")
+
+# Active storage backend; the JSON files above are imported on first use
+store = _open_store()
+
+def _record_price_ticks(ticks: List[Dict]):
+    """Keep every accepted price tick in the append-only tick history"""
+    store.append_many("price_ticks", [{**tick, "tick_id": generate_id("TICK")} for tick in ticks])
+
+# Indexed price table shared by every price lookup
+price_oracle = PriceOracleCache(
+    store.load_prices, store.prices_version, store.put_prices,
+    ttl=PRICE_CACHE_TTL, max_age=PRICE_MAX_AGE, recorder=_record_price_ticks
+)
+
+# Process-wide id source behind generate_id
+id_allocator = IdAllocator(NODE_ID)
 
 def ensure_data_dir():
     """Create data directory if it doesn't exist"""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
     
-    # Initialize empty files if they don't exist
-    for file_path in [CROPS_FILE, TOKENS_FILE, SETTLEMENTS_FILE, AUDIT_LOG_FILE]:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w') as f:
-                json.dump([], f)
-
-def load_json(file_path: str) -> List[Dict]:
-    """Load JSON data from file"""
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                content = f.read()
-                if not content.strip():
-                    return []
-                return json.loads(content)
-        return []
-    except Exception as e:
-        print(f"Error loading {file_path}: {e}")
-        return []
+    # Initialize storage if it doesn't exist
+    store.ensure()
+
+def transaction():
+    """Group storage writes so they are committed together"""
+    return store.transaction()
 
-def save_json(file_path: str, data: List[Dict]):
-    """Save JSON data to file"""
+def data_version():
+    """Token that changes whenever crops, tokens or settlements are written"""
+    return store.version(DATA_COLLECTIONS)
+
+def state_version(file_path: str):
+    """Token that changes whenever a derived-state file is rewritten"""
     try:
-        if not os.path.exists(os.path.dirname(file_path)):
-            os.makedirs(os.path.dirname(file_path))
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-    except Exception as e:
-        print(f"Error saving {file_path}: {e}")
+        stat = os.stat(file_path)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except FileNotFoundError:
+        return None
 
 def generate_id(prefix: str) -> str:
-    """Generate unique ID with timestamp"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-    return f"{prefix}_{timestamp}"
+    """Generate a unique, creation-ordered ID (timestamp, node, sequence)"""
+    return id_allocator.next(prefix)
 
 def generate_hash(data: str) -> str:
     """Generate SHA-256 hash"""
     return hashlib.sha256(data.encode()).hexdigest()
 
+@timed("load_crops")
 def load_crops() -> List[Dict]:
     """Load all crop assets"""
-    return load_json(CROPS_FILE)
+    return store.load("crops")
 
+@timed("save_crop")
 def save_crop(crop: Dict):
     """Save a new crop asset"""
-    crops = load_crops()
-    crops.append(crop)
-    save_json(CROPS_FILE, crops)
+    store.append("crops", crop)
+
+@timed("save_crops")
+def save_crops(crops: List[Dict]):
+    """Save several crop assets in one write"""
+    store.append_many("crops", crops)
 
+@timed("load_tokens")
 def load_tokens() -> List[Dict]:
     """Load all tokens"""
-    return load_json(TOKENS_FILE)
+    return store.load("tokens")
 
+@timed("save_token")
 def save_token(token: Dict):
     """Save a new token"""
-    tokens = load_tokens()
-    tokens.append(token)
-    save_json(TOKENS_FILE, tokens)
-
-def update_token(token_id: str, updates: Dict):
-    """Update an existing token"""
-    tokens = load_tokens()
-    for i, token in enumerate(tokens):
-        if token['token_id'] == token_id:
-            tokens[i].update(updates)
-            save_json(TOKENS_FILE, tokens)
-            return True
-    return False
+    store.append("tokens", token)
+
+@timed("save_tokens")
+def save_tokens(tokens: List[Dict]):
+    """Save several tokens in one write"""
+    store.append_many("tokens", tokens)
+
+@timed("append_token_update")
+def append_token_update(token_id: str, updates: Dict):
+    """Persist updates for a token already known to exist"""
+    store.patch("tokens", token_id, updates)
+
+@timed("append_token_updates")
+def append_token_updates(updates: List[tuple]):
+    """Persist (token_id, updates) pairs for existing tokens in one write"""
+    store.patch_many("tokens", updates)
 
+@timed("load_settlements")
 def load_settlements() -> List[Dict]:
     """Load all settlements"""
-    return load_json(SETTLEMENTS_FILE)
+    return store.load("settlements")
 
+@timed("save_settlement")
 def save_settlement(settlement: Dict):
     """Save a new settlement"""
-    settlements = load_settlements()
-    settlements.append(settlement)
-    save_json(SETTLEMENTS_FILE, settlements)
+    store.append("settlements", settlement)
 
+@timed("save_settlements")
+def save_settlements(settlements: List[Dict]):
+    """Save several settlements in one write"""
+    store.append_many("settlements", settlements)
+
+@timed("load_bids")
+def load_bids() -> List[Dict]:
+    """Load all buyer bids"""
+    return store.load("bids")
+
+@timed("save_bid")
+def save_bid(bid: Dict):
+    """Save a new buyer bid"""
+    store.append("bids", bid)
+
+@timed("update_bids")
+def update_bids(updates: List[tuple]):
+    """Persist (bid_id, updates) pairs for existing bids in one write"""
+    store.patch_many("bids", updates)
+
+def bids_version():
+    """Token that changes whenever bids are written"""
+    return store.version(("bids",))
+
+@timed("load_audit_log")
 def load_audit_log() -> List[Dict]:
     """Load audit log"""
-    return load_json(AUDIT_LOG_FILE)
+    return store.load("audit_log")
 
+@timed("save_audit_entry")
 def save_audit_entry(entry: Dict):
     """Save a new audit log entry"""
-    log = load_audit_log()
-    log.append(entry)
-    save_json(AUDIT_LOG_FILE, log)
+    store.append("audit_log", entry)
+
+@timed("save_audit_entries")
+def save_audit_entries(entries: List[Dict]):
+    """Save several chained audit log entries in one write"""
+    store.append_many("audit_log", entries)
+
+@timed("load_last_audit_entry")
+def load_last_audit_entry() -> Dict | None:
+    """Load the head of the audit chain"""
+    return store.last("audit_log")
 
+def scan_audit_log(after: Any = None):
+    """Iterate (position, entry) over audit entries appended after a position"""
+    return store.scan("audit_log", after)
+
+def scan_price_ticks(after: Any = None):
+    """Iterate (position, tick) over price ticks recorded after a position"""
+    return store.scan("price_ticks", after)
+
+@timed("read_audit_after")
+def read_audit_after(afters: List[Any]) -> List[Dict | None]:
+    """Fetch the audit entry following each scan position, e.g. from an index"""
+    return store.audit_after(afters)
+
+def audit_shards(size: int) -> List[Dict]:
+    """Split the audit log into shards that can be verified independently"""
+    return store.audit_shards(size)
+
+def scan_audit_between(start: datetime | None, end: datetime | None):
+    """Iterate audit entries with a timestamp in [start, end]"""
+    return store.audit_between(start, end)
+
+@timed("load_state")
+def load_state(file_path: str) -> Dict | None:
+    """Load a derived-state file written for the active backend"""
+    try:
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as f:
+                state = json.load(f)
+                note_io(bytes_read=f.tell(), records=1)
+            if state.get('backend') == STORAGE_BACKEND:
+                return state
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+    return None
+
+@timed("save_state")
+def save_state(file_path: str, state: Dict):
+    """Atomically persist a derived-state file tagged with the active backend
+
+    Only fsynced with DHARA_SYNC_WRITES, like the logs the state is derived
+    from; a file lost to a power cut is rebuilt from them.
+    """
+    try:
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**state, 'backend': STORAGE_BACKEND}, f, separators=(',', ':'), default=str)
+            note_io(bytes_written=f.tell(), records=1)
+            if SYNC_WRITES:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except Exception as e:
+        print(f"Error saving {file_path}: {e}")
+
+@timed("read_state_log")
+def read_state_log(file_path: str, offset: int = 0, file_id: Any = None) -> tuple:
+    """(lines, offset, file_id): complete lines of a derived-state log past `offset`
+
+    `file_id` identifies the file the offset belongs to. If the log was
+    rewritten since, it is read from the start and the new id returned.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            current = (stat.st_dev, stat.st_ino)
+            if current != file_id:
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0, None
+    # A line still being appended is picked up by the next read
+    end = data.rfind(b"\n") + 1
+    note_io(bytes_read=end)
+    lines = data[:end].decode().splitlines()
+    return [line for line in lines if line], offset + end, current
+
+@timed("append_state_log")
+def append_state_log(file_path: str, lines: List[str]) -> tuple:
+    """Append lines to a derived-state log; returns (offset, file_id) after them"""
+    payload = "".join(f"{line}\n" for line in lines).encode()
+    with open(file_path, 'ab') as f:
+        f.write(payload)
+        if SYNC_WRITES:
+            f.flush()
+            os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+        note_io(bytes_written=len(payload), records=len(lines))
+        return f.tell(), (stat.st_dev, stat.st_ino)
+
+@timed("write_state_log")
+def write_state_log(file_path: str, lines: List[str]) -> tuple:
+    """Atomically replace a derived-state log; returns (offset, file_id) of the new file"""
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write("".join(f"{line}\n" for line in lines).encode())
+        f.flush()
+        os.fsync(f.fileno())
+        stat = os.fstat(f.fileno())
+        note_io(bytes_written=f.tell(), records=len(lines))
+        size = f.tell()
+    os.replace(tmp_path, file_path)
+    return size, (stat.st_dev, stat.st_ino)
+
+def load_audit_checkpoint() -> Dict | None:
+    """Load the last verified audit checkpoint for the active backend"""
+    return load_state(AUDIT_CHECKPOINT_FILE)
+
+def save_audit_checkpoint(checkpoint: Dict):
+    """Atomically persist an audit checkpoint"""
+    # Verification runs on the read path; the write lock keeps concurrent
+    # verifications and workers from interleaving checkpoint updates
+    with transaction():
+        save_state(AUDIT_CHECKPOINT_FILE, checkpoint)
+
+def clear_audit_checkpoint():
+    """Forget the audit checkpoint so the next verification is full"""
+    with transaction():
+        if os.path.exists(AUDIT_CHECKPOINT_FILE):
+            os.remove(AUDIT_CHECKPOINT_FILE)
+
+@timed("load_prices")
 def load_prices() -> List[Dict]:
     """Load price oracle data"""
-    return load_json(PRICES_FILE)
+    return store.load_prices()
 
+@timed("save_prices")
+def save_prices(prices: List[Dict]) -> Dict:
+    """Store fresh price ticks through the oracle cache"""
+    # Under the write lock the oracle merges against the latest stored table
+    with transaction():
+        return price_oracle.push(prices)
+
+@timed("get_price")
 def get_price(crop_type: str, mandi_id: str) -> float:
     """Get price for a crop from oracle"""
-    prices = load_prices()
-    for price in prices:
-        if price['crop_type'] == crop_type and price['mandi_id'] == mandi_id:
-            return price['price_per_kg']
+    price = price_oracle.get(crop_type, mandi_id)
+    if price:
+        return price['price_per_kg']
     
     # Default fallback prices
     default_prices = {
@@ -124,20 +324,4 @@ def get_price(crop_type: str, mandi_id: str) -> float:
         'rice': 28.0,
         'cotton': 45.0
     }
-    return default_prices.get(crop_type.lower(), 20.0)
-
-def find_token_by_id(token_id: str) -> Dict | None:
-    """Find token by ID"""
-    tokens = load_tokens()
-    for token in tokens:
-        if token['token_id'] == token_id:
-            return token
-    return None
-
-def find_crop_by_id(crop_id: str) -> Dict | None:
-    """Find crop by ID"""
-    crops = load_crops()
-    for crop in crops:
-        if crop['crop_id'] == crop_id:
-            return crop
-    return None
\ No newline at end of file
+    return default_prices.get(crop_type.lower(), 20.0)
\ No newline at end of file
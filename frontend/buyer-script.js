@@ -59,6 +59,32 @@ function initializeDashboard() {
     // Setup filter
     document.getElementById('statusFilter').value = 'LISTED';
     document.getElementById('statusFilter').addEventListener('change', loadTokens);
+
+    // Follow new events live
+    subscribeToEvents();
+}
+
+// Refresh on events pushed by the server instead of polling
+let eventSource = null;
+let refreshTimer = null;
+
+function subscribeToEvents() {
+    if (!window.EventSource) return;
+    eventSource = new EventSource(`${API_BASE}/events?event_type=TOKEN_LISTED,TRADE_SETTLED`);
+    eventSource.onmessage = scheduleRefresh;
+    // Sent when this page fell behind; the browser reconnects and replays from the last event id
+    eventSource.addEventListener('overflow', scheduleRefresh);
+}
+
+// Coalesce bursts of events into one refresh
+function scheduleRefresh() {
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(() => {
+        loadTokens();
+        updateStats();
+        if (document.getElementById('purchasesTab').classList.contains('active')) loadPurchases();
+        if (document.getElementById('auditTab').classList.contains('active')) loadAuditTrail();
+    }, 500);
 }
 
 // Update wallet display
@@ -324,6 +350,7 @@ async function verifyAuditIntegrity() {
 // Logout
 function logout() {
     if (confirm('Are you sure you want to logout?')) {
+        if (eventSource) eventSource.close();
         localStorage.removeItem('dharaUser');
         window.location.href = 'index.html';
     }
@@ -53,6 +53,31 @@ function initializeDashboard() {
     
     // Setup form submission
     document.getElementById('cropForm').addEventListener('submit', registerCrop);
+
+    // Follow new events live
+    subscribeToEvents();
+}
+
+// Refresh on events pushed by the server instead of polling
+let eventSource = null;
+let refreshTimer = null;
+
+function subscribeToEvents() {
+    if (!window.EventSource) return;
+    eventSource = new EventSource(`${API_BASE}/events?farmer_id=${encodeURIComponent(currentUser.id)}`);
+    eventSource.onmessage = scheduleRefresh;
+    // Sent when this page fell behind; the browser reconnects and replays from the last event id
+    eventSource.addEventListener('overflow', scheduleRefresh);
+}
+
+// Coalesce bursts of events into one refresh
+function scheduleRefresh() {
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(() => {
+        loadMyTokens();
+        updateStats();
+        if (document.getElementById('auditTab').classList.contains('active')) loadAuditTrail();
+    }, 500);
 }
 
 // Update mini stats
@@ -251,6 +276,7 @@ async function verifyAuditIntegrity() {
 // Logout
 function logout() {
     if (confirm('Are you sure you want to logout?')) {
+        if (eventSource) eventSource.close();
         localStorage.removeItem('dharaUser');
         window.location.href = 'index.html';
     }